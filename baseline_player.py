@@ -1,44 +1,61 @@
+import math
 import random
+import functools
+import multiprocessing as mp
+import time
+from collections import OrderedDict
+import numpy as np
 import game
-import copy
+from solver import encode_state
 class BaselinePlayer(game.Player):
     def decide(self, state):
-        curhp = state["hp"][state["turn"]]
-        heal = state["heal_left"][state["turn"]]
-        reveal = state["reveal_left"][state["turn"]]
-        d = state["damage_per_shot"]
-        maxhp = state["max_hp"]
-        pr_real = state["Left_real"] / (state["Left_fake"] + state["Left_real"] + 10 ** -10)
-        curbullet = state["chamber"][state["pos"]]
+        turn = state.turn
+        curhp = state.hp[turn]
+        heal = state.heal_left[turn]
+        reveal = state.reveal_left[turn]
+        d = state.damage_per_shot
+        maxhp = state.max_hp
+        pr_real = state.Left_real / (state.Left_fake + state.Left_real + 10 ** -10)
+        revealed = (state.revealed[turn] >> state.pos) & 1
         if heal > 0 and maxhp - curhp >= d:
             return 2
-        elif reveal > 0 and curbullet[1][state["turn"]] == 0:
+        elif reveal > 0 and revealed == 0:
             return 3
-        elif curbullet[1][state["turn"]] == 1:
-            if state["double_left"][state["turn"]] > 0 and state["double_mark"] == 0 and curbullet[0] == 1:
-                return 4
-            return curbullet[0][0]  # 0 -> fake -> self, 1 -> real -> opponent
-        elif state["random_reveal_left"][state["turn"]] > 0:
+        elif revealed == 1:
+            return (state.live >> state.pos) & 1  # 0 -> fake -> self, 1 -> real -> opponent
+        elif state.random_reveal_left[turn] > 0:
             return 7
-        elif state["skip_round_left"][state["turn"]] > 0 and state["skip_round_mark"] == 0:
+        elif state.skip_round_left[turn] > 0 and state.skip_round_mark == 0:
             return 5
-        elif state["skip_bullet_left"][state["turn"]] > 0:
+        elif state.skip_bullet_left[turn] > 0:
             return 6
         elif pr_real < 0.5:
             return 0
         else:
-            if state["double_left"][state["turn"]] > 0 and state["double_mark"] == 0:
+            if state.double_left[turn] > 0 and state.double_mark == 0:
                 return 4
             return 1
 
+    def decide_batch(self, states):
+        # decide() is TBaselinePlayer's rules with thresholds that never block an item
+        return ACTION_TABLE[situation_index(states) | pr_codes(0.5, 1.0, 1.0)[states.Left_real, states.Left_fake]]
+
 
 class RandomPlayer(game.Player):
     def __init__(self, seed=300300):
+        self.seed = seed
         self.rng = random.Random(seed)
 
+    def new_game(self, seed):
+        self.rng = random.Random(f"{self.seed}/{seed}")
+
     def decide(self, state):
         return self.rng.randint(0, 7)
 
+    def decide_batch(self, states):
+        # Draws from the same stream as decide(), but in batch order rather than game order
+        return np.array([self.rng.randint(0, 7) for _ in range(len(states))], dtype=np.int64)
+
 
 class TBaselinePlayer(game.Player):
     def __init__(self, t_shoot=0.5, t_reveal = 0.5, t_use = 0.5):
@@ -46,113 +63,393 @@ class TBaselinePlayer(game.Player):
         self.t_reveal = t_reveal
         self.t_use = t_use
     def decide(self, state):
-        curhp = state["hp"][state["turn"]]
-        heal = state["heal_left"][state["turn"]]
-        reveal = state["reveal_left"][state["turn"]]
-        d = state["damage_per_shot"]
-        maxhp = state["max_hp"]
-        pr_real = state["Left_real"] / (state["Left_fake"] + state["Left_real"] + 10 ** -10)
-        curbullet = state["chamber"][state["pos"]]
+        turn = state.turn
+        curhp = state.hp[turn]
+        heal = state.heal_left[turn]
+        reveal = state.reveal_left[turn]
+        d = state.damage_per_shot
+        maxhp = state.max_hp
+        pr_real = state.Left_real / (state.Left_fake + state.Left_real + 10 ** -10)
+        revealed = (state.revealed[turn] >> state.pos) & 1
         uncertainty = abs(pr_real - 0.5)
         if heal > 0 and maxhp - curhp >= d:
             return 2
-        elif reveal > 0 and curbullet[1][state["turn"]] == 0 and uncertainty <= self.t_reveal:
+        elif reveal > 0 and revealed == 0 and uncertainty <= self.t_reveal:
             return 3
-        elif curbullet[1][state["turn"]] == 1:
-            if state["double_left"][state["turn"]] > 0 and state["double_mark"] == 0 and curbullet[0] == 1:
-                return 4
-            return curbullet[0][0]  # 0 -> fake -> self, 1 -> real -> opponent
-        elif state["random_reveal_left"][state["turn"]] > 0:
+        elif revealed == 1:
+            return (state.live >> state.pos) & 1  # 0 -> fake -> self, 1 -> real -> opponent
+        elif state.random_reveal_left[turn] > 0:
             return 7
-        elif state["skip_round_left"][state["turn"]] > 0 and state["skip_round_mark"] == 0 and uncertainty < self.t_use:
+        elif state.skip_round_left[turn] > 0 and state.skip_round_mark == 0 and uncertainty < self.t_use:
             return 5
-        elif state["skip_bullet_left"][state["turn"]] > 0 and uncertainty < self.t_use:
+        elif state.skip_bullet_left[turn] > 0 and uncertainty < self.t_use:
             return 6
         elif pr_real < self.t_shoot:
             return 0
         else:
-            if state["double_left"][state["turn"]] > 0 and state["double_mark"] == 0:
+            if state.double_left[turn] > 0 and state.double_mark == 0:
                 return 4
             return 1
 
+    def decide_batch(self, states):
+        # Same rules as decide() over a vec_game.VecGame, as one gather from ACTION_TABLE
+        codes = pr_codes(self.t_shoot, self.t_reveal, self.t_use)
+        return ACTION_TABLE[situation_index(states) | codes[states.Left_real, states.Left_fake]]
+
+
+def build_action_table():
+    """
+    Action of the (T)Baseline rules for every situation index.
+
+    Bits 0-7 describe the mover's options (situation_index), bits 8-10 compare pr_real
+    with the thresholds (pr_codes); the priority order is the one in decide().
+    """
+    table = np.empty(1 << 11, dtype=np.int64)
+    for idx in range(len(table)):
+        heal, reveal, revealed, live, rand, skip_round, skip_bullet, double, c_reveal, c_use, c_shoot = (
+            (idx >> b) & 1 for b in range(11))
+        if heal:
+            a = 2
+        elif reveal and not revealed and c_reveal:
+            a = 3
+        elif revealed:
+            a = live
+        elif rand:
+            a = 7
+        elif skip_round and c_use:
+            a = 5
+        elif skip_bullet and c_use:
+            a = 6
+        elif c_shoot:
+            a = 0
+        elif double:
+            a = 4
+        else:
+            a = 1
+        table[idx] = a
+    return table
+
+
+ACTION_TABLE = build_action_table()
+
+
+def situation_index(states):
+    # Bits 0-7 of the ACTION_TABLE index for every game of a VecGame
+    revealed = (states.mover(states.revealed) >> states.pos) & 1
+    return (((states.mover(states.heal_left) > 0) & (states.max_hp - states.mover(states.hp) >= states.damage_per_shot))
+            | (states.mover(states.reveal_left) > 0) << 1
+            | revealed << 2
+            | ((states.live >> states.pos) & 1) << 3
+            | (states.mover(states.random_reveal_left) > 0) << 4
+            | ((states.mover(states.skip_round_left) > 0) & (states.skip_round_mark == 0)) << 5
+            | (states.mover(states.skip_bullet_left) > 0) << 6
+            | ((states.mover(states.double_left) > 0) & (states.double_mark == 0)) << 7)
+
+
+@functools.lru_cache(maxsize=None)
+def pr_codes(t_shoot, t_reveal, t_use):
+    """
+    Bits 8-10 of the ACTION_TABLE index for each (Left_real, Left_fake) up to 63 rounds:
+    the threshold tests on pr_real, computed with the same float arithmetic as decide().
+    """
+    real = np.arange(64)[:, None]
+    fake = np.arange(64)[None, :]
+    pr_real = real / (fake + real + 10 ** -10)
+    uncertainty = np.abs(pr_real - 0.5)
+    return ((uncertainty <= t_reveal).astype(np.int64) << 8
+            | (uncertainty < t_use).astype(np.int64) << 9
+            | (pr_real < t_shoot).astype(np.int64) << 10)
+
+
+def rollout_value(state, a, seed, policy, resample=False):
+    # Play action a on a copy of state, finish the game with `policy` on both sides, and
+    # score it for the player to move; reveals (and with resample=True the rounds the
+    # mover has not seen, see game.sample_live) draw from Random(seed)
+    st = state.clone()
+    st.rng = random.Random(seed)
+    if resample:
+        st.live = game.sample_live(state, state.turn, st.rng)
+    apply_action(st, a)
+    res, _, _, _ = game.run_game(st, policy, policy, record="none")
+    return res if state.turn == 0 else -res
+
+
+_ROLLOUT_WORKER = {}
+
+
+def _init_rollout_worker(policy):
+    _ROLLOUT_WORKER["policy"] = policy
+
+
+def _rollout_job(job):
+    packed, a, k0, k1, base_seed, resample = job
+    state = game.GameState.unpack(packed)
+    return [rollout_value(state, a, base_seed + k, _ROLLOUT_WORKER["policy"], resample) for k in range(k0, k1)]
+
+
+class RolloutCache:
+    """
+    Bounded LRU store of rollout statistics shared across decisions and games.
+
+    Keys are information states as seen by the player to move: the env's damage and max
+    hp, solver.encode_state without its current / next round fields, and the mover's
+    reveals of the remaining rounds with their contents. Values map each action to
+    [rollouts, summed value].
+    """
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(state):
+        own = state.revealed[state.turn]
+        return ((state.damage_per_shot, state.max_hp) + encode_state(state)[:-2]
+                + (own >> state.pos, (state.live & own) >> state.pos))
+
+    def lookup(self, state):
+        # Entry for this information state, created (and the oldest evicted) on a miss
+        key = self.key(state)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry
+        self.misses += 1
+        entry = self.entries[key] = {}
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        return entry
+
+    def stats(self):
+        return {"size": len(self.entries), "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
 class RolloutPlayer(game.Player):
     """
     One-step rollout search:
-    - For each candidate action a, apply a to a deepcopy(state)
+    - For each candidate action a, apply a to a clone of the state
     - Then finish the game with fixed rollout policies for both sides
     - Choose a with best average outcome over N rollouts
+
+    Rollout k of every action draws its random reveals from Random(base_seed + k), so the
+    actions are compared under common random numbers.
+
+    adaptive=True replaces the fixed N per action by successive halving: survivors get an
+    equal share of the remaining `budget` rollouts (default N per legal action), the worse
+    half is dropped after each stage, and the search stops early once the leader beats every
+    other survivor by `z` standard errors of the paired difference (or ties it on every
+    shared rollout). `time_budget_ms` caps the wall-clock time of one decision in either mode.
+
+    With a RolloutCache the fixed-budget search keeps its per-action statistics across
+    decisions and games: an information state seen before is only topped up to
+    `min_samples` rollouts per action (default N), plus `refine_rollouts` more on every
+    visit so the estimates keep improving. Rollouts stored in the cache redraw the rounds
+    the mover has not seen (game.sample_live), so an entry is an unbiased estimate for
+    its information state whichever game filled it, and no longer profits from replaying
+    the true chamber as the uncached search does.
+
+    n_workers > 1 runs the rollouts of a decision on a process pool that is started on the
+    first decision and kept (with the rollout policy loaded) until close(). Rollout k still
+    uses seed base_seed + k, so every mode picks the same action as the serial search; the
+    time budget is only enforced serially. The pool cannot be started inside a daemonic
+    worker, e.g. one of play_many_games(n_workers > 1).
     """
-    def __init__(self, n_rollouts=20, seed=0, rollout_policy=None):
+    def __init__(self, n_rollouts=20, seed=0, rollout_policy=None, adaptive=False, budget=None,
+                 time_budget_ms=None, min_rollouts=2, z=2.0, cache=None, min_samples=None, refine_rollouts=0,
+                 n_workers=1):
         self.n_rollouts = int(n_rollouts)
+        self.seed = seed
         self.rng = random.Random(seed)
+        self.adaptive = adaptive
+        self.budget = budget
+        self.time_budget_ms = time_budget_ms
+        self.min_rollouts = min_rollouts
+        self.z = z
+        self.cache = cache
+        self.min_samples = self.n_rollouts if min_samples is None else min_samples
+        self.refine_rollouts = refine_rollouts
+        self.n_workers = n_workers
+        self.pool = None
+        self.simulations = 0
 
         # Default rollout policy: a moderately sensible threshold heuristic
         self.rollout_policy = rollout_policy if rollout_policy is not None else TBaselinePlayer(t_shoot=0.6, t_reveal=0.25, t_use=0.4)
 
+    def new_game(self, seed):
+        self.rng = random.Random(f"{self.seed}/{seed}")
+
+    def __getstate__(self):
+        # Players are pickled into evaluation workers; the pool stays behind
+        d = self.__dict__.copy()
+        d["pool"] = None
+        return d
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
+
+    def rollout(self, state, a, k, base_seed, resample=False):
+        self.simulations += 1
+        return rollout_value(state, a, base_seed + k, self.rollout_policy, resample)
+
+    def rollouts(self, state, ranges, base_seed, resample=False):
+        """Values of rollouts k0..k1-1 for every (a, k0, k1) in ranges, as {a: [values]}."""
+        out = {a: [] for a, _, _ in ranges}
+        if self.n_workers <= 1:
+            for a, k0, k1 in ranges:
+                out[a] = [self.rollout(state, a, k, base_seed, resample) for k in range(k0, k1)]
+            return out
+
+        if self.pool is None:
+            self.pool = mp.Pool(self.n_workers, initializer=_init_rollout_worker,
+                                initargs=(self.rollout_policy,))
+        packed = state.pack()
+        # A few chunks per worker keeps them busy when actions finish unevenly
+        total = sum(k1 - k0 for _, k0, k1 in ranges)
+        chunk = max(1, total // (4 * self.n_workers))
+        jobs = [(packed, a, k, min(k + chunk, k1), base_seed, resample)
+                for a, k0, k1 in ranges for k in range(k0, k1, chunk)]
+        for job, values in zip(jobs, self.pool.map(_rollout_job, jobs)):
+            out[job[1]].extend(values)
+        self.simulations += total
+        return out
+
     def decide(self, state):
-        player_id = state["turn"]
         legal = legal_actions(state)
+        base_seed = self.rng.randint(0, 10**9)
+        deadline = None
+        if self.time_budget_ms is not None:
+            deadline = time.perf_counter() + self.time_budget_ms / 1000
+        if self.adaptive:
+            return self._decide_adaptive(state, legal, base_seed, deadline)
+        if self.cache is not None:
+            return self._decide_cached(state, legal, base_seed, deadline)
+
+        if self.n_workers > 1:
+            values = self.rollouts(state, [(a, 0, self.n_rollouts) for a in legal], base_seed)
+            return max(legal, key=lambda a: sum(values[a]) / len(values[a]))
 
         best_a = legal[0]
         best_v = -1e18
-        base_seed = self.rng.randint(0, 10**9)
 
         for a in legal:
             v = 0.0
+            n = 0
             for k in range(self.n_rollouts):
-                st = copy.deepcopy(state)
-                apply_action(st, a)
+                if deadline is not None and n and time.perf_counter() > deadline:
+                    break
+                v += self.rollout(state, a, k, base_seed)
+                n += 1
 
-                p0 = self.rollout_policy
-                p1 = self.rollout_policy
-                res, _, _, _ = game.run_game(st, p0, p1)
+            v /= n
+            if v > best_v:
+                best_v = v
+                best_a = a
 
-                v += res if player_id == 0 else -res
+        return best_a
 
-            v /= self.n_rollouts
+    def _decide_cached(self, state, legal, base_seed, deadline):
+        entry = self.cache.lookup(state)
+        best_a = legal[0]
+        best_v = -1e18
+
+        if self.n_workers > 1:
+            ranges = []
+            for a in legal:
+                s = entry.setdefault(a, [0, 0.0])
+                ranges.append((a, s[0], s[0] + max(self.min_samples - s[0], 0) + self.refine_rollouts))
+            for a, values in self.rollouts(state, ranges, base_seed, resample=True).items():
+                for v in values:
+                    entry[a][1] += v
+                entry[a][0] += len(values)
+            return max(legal, key=lambda a: entry[a][1] / entry[a][0] if entry[a][0] else -1e18)
+
+        for a in legal:
+            s = entry.setdefault(a, [0, 0.0])
+            need = max(self.min_samples - s[0], 0) + self.refine_rollouts
+            for j in range(need):
+                if deadline is not None and s[0] and time.perf_counter() > deadline:
+                    break
+                s[1] += self.rollout(state, a, s[0], base_seed, resample=True)
+                s[0] += 1
+
+            v = s[1] / s[0] if s[0] else -1e18
             if v > best_v:
                 best_v = v
                 best_a = a
 
         return best_a
 
+    def _decide_adaptive(self, state, legal, base_seed, deadline):
+        budget = self.budget if self.budget is not None else self.n_rollouts * len(legal)
+        values = {a: [] for a in legal}
+        survivors = list(legal)
+        spent = 0
+        while len(survivors) > 1:
+            stages_left = math.ceil(math.log2(len(survivors)))
+            per = max(self.min_rollouts, (budget - spent) // (len(survivors) * stages_left))
+            out_of_time = False
+            if self.n_workers > 1:
+                new = self.rollouts(state, [(a, len(values[a]), len(values[a]) + per) for a in survivors], base_seed)
+                for a in survivors:
+                    values[a].extend(new[a])
+            else:
+                for a in survivors:
+                    for _ in range(per):
+                        values[a].append(self.rollout(state, a, len(values[a]), base_seed))
+                        if deadline is not None and time.perf_counter() > deadline:
+                            out_of_time = True
+                            break
+                    if out_of_time:
+                        break
+            spent = sum(len(v) for v in values.values())
+
+            # Stable sort: ties keep legal order, as in the fixed-budget search
+            survivors.sort(key=lambda a: -sum(values[a]) / len(values[a]) if values[a] else 1e18)
+            if out_of_time or spent >= budget or self._separated(values, survivors):
+                break
+            survivors = survivors[:(len(survivors) + 1) // 2]
+        return survivors[0]
+
+    def _separated(self, values, survivors):
+        best = values[survivors[0]]
+        for a in survivors[1:]:
+            diff = [vb - va for vb, va in zip(best, values[a])]
+            n = len(diff)
+            if n < 2:
+                return False
+            if not any(diff):
+                # Identical on every shared rollout: more samples will not split them
+                continue
+            mean = sum(diff) / n
+            var = sum((d - mean) ** 2 for d in diff) / (n - 1)
+            if mean - self.z * math.sqrt(var / n) <= 0:
+                return False
+        return True
+
 
 def legal_actions(state):
-    turn = state["turn"]
+    turn = state.turn
     acts = [0, 1]
 
-    if state["heal_left"][turn] > 0 and state["hp"][turn] < state["max_hp"]:
+    if state.heal_left[turn] > 0 and state.hp[turn] < state.max_hp:
         acts.append(2)
-    if state["reveal_left"][turn] > 0 and state["chamber"][state["pos"]][1] == 0:
-        acts.append(3)
-    if state["double_left"][turn] > 0 and state["double_mark"] == 0:
+    # Reveal (3) is not offered: the old chamber check compared the reveal pair with 0 and never passed
+    if state.double_left[turn] > 0 and state.double_mark == 0:
         acts.append(4)
-    if state["skip_round_left"][turn] > 0 and state["skip_round_mark"] == 0:
+    if state.skip_round_left[turn] > 0 and state.skip_round_mark == 0:
         acts.append(5)
-    if state["skip_bullet_left"][turn] > 0 and state["pos"] + 1 <= len(state["chamber"]):
+    if state.skip_bullet_left[turn] > 0 and state.pos + 1 <= state.n_rounds:
         acts.append(6)
-    if state["random_reveal_left"][state["turn"]] > 0:
+    if state.random_reveal_left[turn] > 0:
         acts.append(7)
 
     return acts
 
 
-def apply_action(state, action):
-    if action == 0:
-        game.shot(state, 0)
-    elif action == 1:
-        game.shot(state, 1)
-    elif action == 2:
-        game.use_heal(state)
-    elif action == 3:
-        game.use_reveal(state)
-    elif action == 4:
-        game.use_double(state)
-    elif action == 5:
-        game.use_skip_round(state)
-    elif action == 6:
-        game.use_skip_bullet(state)
-    elif action == 7:
-        game.use_reveal_random(state)
-    else:
-        game.illegal_penalty(state)
\ No newline at end of file
+apply_action = game.apply_action
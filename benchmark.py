@@ -0,0 +1,250 @@
+"""
+Speed benchmarks on fixed, seeded workloads.
+
+    python benchmark.py run [--only NAME ...] [--results PATH]
+    python benchmark.py compare [BASE [NEW]] [--tolerance 0.1] [--results PATH]
+
+`run` times every workload and stores the metrics in the results file under
+machine -> commit, replacing an earlier run of the same commit. `compare` checks two
+commits of this machine (by default the current one against the previous entry) and
+exits with status 1 if any metric got worse by more than the tolerance. Metric names
+ending in _per_sec are throughputs and win_rate playing strength (higher is better),
+_ms are latencies (lower is better).
+
+Throughputs are the best of REPEAT timings; the workloads are the same on every run so
+numbers from one machine are comparable across commits.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+import numpy as np
+import game
+from vec_game import VecGame
+from baseline_player import BaselinePlayer, TBaselinePlayer, RandomPlayer, RolloutPlayer
+from ismcts import ISMCTSPlayer
+from instrumentation import Collector
+from data_extraction import build_player_pool, collect_shard
+from train_models import CANONICAL_ENV, ModelPlayer, build_model, play_many_games
+
+RESULTS_PATH = os.path.join("benchmarks", "results.json")
+REPEAT = 3
+SEED = 20240
+
+
+def best_rate(fn, n_items, repeat=REPEAT):
+    # Items per second of the fastest of `repeat` calls
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t)
+    return n_items / best
+
+
+def canonical_games(n, seed=SEED):
+    return [game.init_game(seed=seed + i, reveal_seed=game.reveal_seed_for(seed + i), **CANONICAL_ENV)
+            for i in range(n)]
+
+
+def sample_states(n, seed=SEED):
+    # Positions from Baseline self-play, every decision point of each game
+    states = []
+    baseline = BaselinePlayer()
+    i = 0
+    while len(states) < n:
+        st = game.init_game(seed=seed + i, reveal_seed=game.reveal_seed_for(seed + i), **CANONICAL_ENV)
+        while game.check_finish(st) is None and len(states) < n:
+            states.append(st.clone())
+            game.apply_action(st, baseline.decide(st))
+        i += 1
+    return states
+
+
+def bench_run_game():
+    players = {
+        "baseline": (BaselinePlayer(), 2000),
+        "tbaseline": (TBaselinePlayer(0.6, 0.25, 0.4), 2000),
+        "random": (RandomPlayer(SEED), 2000),
+        "rollout5": (RolloutPlayer(n_rollouts=5, seed=SEED), 20),
+    }
+    out = {}
+    for name, (player, n) in players.items():
+        # One fresh set of states per timed call, built up front so init_game is not timed
+        batches = [canonical_games(n) for _ in range(REPEAT)]
+
+        def play():
+            opponent = BaselinePlayer()
+            for i, st in enumerate(batches.pop()):
+                player.new_game(i)
+                game.run_game(st, player, opponent, record="none")
+        out[f"run_game.{name}.games_per_sec"] = best_rate(play, n)
+    return out
+
+
+def bench_state_to_feature():
+    states = sample_states(5000)
+    return {"state_to_feature.calls_per_sec": best_rate(lambda: [game.state_to_feature(s) for s in states], len(states))}
+
+
+def bench_rollout_decide():
+    states = sample_states(100, seed=SEED + 1)
+    out = {}
+    for n in (5, 10, 20):
+        player = RolloutPlayer(n_rollouts=n, seed=SEED)
+        player.new_game(0)
+        times = []
+        for st in states:
+            t = time.perf_counter()
+            player.decide(st)
+            times.append((time.perf_counter() - t) * 1000)
+        for q in (50, 95, 99):
+            out[f"rollout_decide.n{n}.p{q}_ms"] = float(np.percentile(times, q))
+    return out
+
+
+def bench_collect():
+    players = build_player_pool(20, SEED)
+    rows = []
+
+    def collect():
+        X, _ = collect_shard(players, 0, 100, SEED)
+        rows.append(len(X))
+    rate = best_rate(collect, 1)
+    return {"collect.rows_per_sec": rate * rows[0]}
+
+
+def bench_model_player():
+    players = build_player_pool(20, SEED)
+    X, y = collect_shard(players, 0, 300, SEED)
+    states = sample_states(200, seed=SEED + 2)
+    batch = VecGame(canonical_games(5000, seed=SEED + 3))
+    out = {}
+    for name in ("lr", "sgd", "rf", "mlp"):
+        player = ModelPlayer(build_model(name).fit(X, y))
+        out[f"model.{name}.decide_per_sec"] = best_rate(lambda: [player.decide(s) for s in states], len(states))
+        out[f"model.{name}.batch_per_sec"] = best_rate(lambda: player.decide_batch(batch), len(batch))
+    return out
+
+
+def bench_matched_budget():
+    # ISMCTS given Rollout(10)'s measured CPU time per decision, both against Baseline on
+    # the same seeds. Flat rollouts replay the true chamber; ISMCTS samples chambers
+    # consistent with what the mover has seen, so this is strength per CPU-second
+    # without that advantage on ISMCTS's side.
+    n_games = 200
+    out = {}
+
+    def play(name, player):
+        c = Collector()
+        m = play_many_games(player, BaselinePlayer(), n_games, SEED, CANONICAL_ENV, collector=c)
+        d = c.decide[player.label]
+        out[f"matched.{name}.decide_ms"] = d["seconds"] / d["count"] * 1000
+        out[f"matched.{name}.win_rate"] = m["win_rate_p0"]
+
+    play("rollout10", RolloutPlayer(n_rollouts=10, seed=SEED))
+    budget = out["matched.rollout10.decide_ms"]
+    play("ismcts", ISMCTSPlayer(n_iterations=10**9, time_budget_ms=budget, seed=SEED))
+    return out
+
+
+WORKLOADS = {
+    "run_game": bench_run_game,
+    "state_to_feature": bench_state_to_feature,
+    "rollout_decide": bench_rollout_decide,
+    "collect": bench_collect,
+    "model_player": bench_model_player,
+    "matched_budget": bench_matched_budget,
+}
+
+
+def machine_key():
+    return f"{platform.node()}/{platform.machine()}/{os.cpu_count()}cpu/py{platform.python_version()}"
+
+
+def commit_key():
+    def git(*args):
+        return subprocess.run(["git", *args], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    commit = git("rev-parse", "--short", "HEAD") or "unknown"
+    return commit + ("-dirty" if git("status", "--porcelain", "--untracked-files=no") else "")
+
+
+def load_results(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def run(names, path):
+    metrics = {}
+    for name in names:
+        t = time.perf_counter()
+        metrics.update(WORKLOADS[name]())
+        print(f"{name}: {time.perf_counter() - t:.1f}s", file=sys.stderr)
+
+    results = load_results(path)
+    entry = {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "metrics": metrics}
+    runs = results.setdefault(machine_key(), {})
+    commit = commit_key()
+    if commit in runs:
+        # Keep metrics of workloads not re-run this time
+        entry["metrics"] = {**runs.pop(commit)["metrics"], **metrics}
+    runs[commit] = entry
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "w") as fh:
+        json.dump(results, fh, indent=1)
+    os.replace(path + ".tmp", path)
+
+    for k, v in sorted(metrics.items()):
+        print(f"{k:45s} {v:14.2f}")
+    return metrics
+
+
+def compare(path, base=None, new=None, tolerance=0.1):
+    runs = load_results(path).get(machine_key(), {})
+    order = list(runs)   # insertion order = order of the runs
+    if new is None:
+        new = commit_key() if commit_key() in runs else order[-1] if order else None
+    if base is None:
+        earlier = order[:order.index(new)] if new in order else []
+        base = earlier[-1] if earlier else None
+    if base not in runs or new not in runs:
+        raise SystemExit(f"Need results for both commits on {machine_key()}, have: {order}")
+
+    regressions = []
+    a, b = runs[base]["metrics"], runs[new]["metrics"]
+    print(f"{base} -> {new} (tolerance {tolerance:.0%})")
+    for k in sorted(set(a) & set(b)):
+        change = (b[k] - a[k]) / a[k] if a[k] else 0.0
+        worse = -change if k.endswith(("_per_sec", "win_rate")) else change
+        flag = ""
+        if worse > tolerance:
+            flag = "REGRESSION"
+            regressions.append(k)
+        elif worse < -tolerance:
+            flag = "improved"
+        print(f"{k:45s} {a[k]:14.2f} {b[k]:14.2f} {change:+8.1%} {flag}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Speed benchmarks")
+    parser.add_argument("--results", default=RESULTS_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_run = sub.add_parser("run")
+    p_run.add_argument("--only", nargs="+", choices=list(WORKLOADS), default=list(WORKLOADS))
+    p_cmp = sub.add_parser("compare")
+    p_cmp.add_argument("base", nargs="?")
+    p_cmp.add_argument("new", nargs="?")
+    p_cmp.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args()
+
+    if args.command == "run":
+        run(args.only, args.results)
+    else:
+        sys.exit(1 if compare(args.results, args.base, args.new, args.tolerance) else 0)
@@ -0,0 +1,156 @@
+"""
+Trained policies compiled to plain NumPy arrays.
+
+export_policy() turns a fitted build_model() estimator into a directory of .npy files plus
+a small meta.json; CompiledPolicyPlayer memory-maps them back and predicts without
+importing scikit-learn. The kernels repeat sklearn's arithmetic step by step (dtypes,
+in-place casts, summation order), so they pick the same action.
+"""
+import os
+import sys
+import json
+import numpy as np
+import game
+
+
+def export_policy(clf, out_dir):
+    # sklearn is only needed here, never on the inference side
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.linear_model._base import LinearClassifierMixin
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.neural_network import MLPClassifier
+
+    arrays = {}
+    scaler = None
+    est = clf
+    if isinstance(clf, Pipeline):
+        if len(clf.steps) != 2 or not isinstance(clf.steps[0][1], StandardScaler):
+            raise ValueError("Only StandardScaler + estimator pipelines can be exported")
+        scaler, est = clf.steps[0][1], clf.steps[1][1]
+    if scaler is not None:
+        arrays["scaler_mean"] = scaler.mean_
+        arrays["scaler_scale"] = scaler.scale_
+
+    if isinstance(est, LinearClassifierMixin):
+        kind = "linear"
+        arrays["coef"] = est.coef_
+        arrays["intercept"] = est.intercept_
+    elif isinstance(est, RandomForestClassifier):
+        kind = "forest"
+        feature, threshold, left, right, value, roots = [], [], [], [], [], []
+        offset = 0
+        for tree in est.estimators_:
+            t = tree.tree_
+            leaf = t.children_left == -1
+            idx = np.arange(t.node_count)
+            # Leaves point at themselves and never branch, so traversal can run a fixed depth
+            feature.append(np.where(leaf, 0, t.feature))
+            threshold.append(np.where(leaf, np.inf, t.threshold))
+            left.append(np.where(leaf, idx, t.children_left) + offset)
+            right.append(np.where(leaf, idx, t.children_right) + offset)
+            value.append(t.value[:, 0, :len(est.classes_)])
+            roots.append(offset)
+            offset += t.node_count
+        arrays["feature"] = np.concatenate(feature).astype(np.int32)
+        arrays["threshold"] = np.concatenate(threshold)
+        arrays["left"] = np.concatenate(left).astype(np.int32)
+        arrays["right"] = np.concatenate(right).astype(np.int32)
+        arrays["value"] = np.concatenate(value)
+        arrays["roots"] = np.array(roots, dtype=np.int32)
+    elif isinstance(est, MLPClassifier):
+        if est.activation != "relu" or est.out_activation_ != "softmax":
+            raise ValueError("Only relu MLPs with a softmax output can be exported")
+        kind = "mlp"
+        for i, (w, b) in enumerate(zip(est.coefs_, est.intercepts_)):
+            arrays[f"coef_{i}"] = w
+            arrays[f"intercept_{i}"] = b
+    else:
+        raise ValueError(f"Cannot export {type(est).__name__}")
+    arrays["classes"] = est.classes_.astype(np.int64)
+
+    os.makedirs(out_dir, exist_ok=True)
+    for name, arr in arrays.items():
+        np.save(os.path.join(out_dir, f"{name}.npy"), np.ascontiguousarray(arr))
+    meta = {"kind": kind, "scaled": scaler is not None,
+            "n_layers": len(est.coefs_) if kind == "mlp" else 0,
+            "depth": max(tree.tree_.max_depth for tree in est.estimators_) if kind == "forest" else 0,
+            "arrays": sorted(arrays)}
+    with open(os.path.join(out_dir, "meta.json"), "w") as fh:
+        json.dump(meta, fh, indent=1)
+
+
+class CompiledPolicy:
+    def __init__(self, path):
+        with open(os.path.join(path, "meta.json")) as fh:
+            self.meta = json.load(fh)
+        self.a = {name: np.asarray(np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r"))
+                  for name in self.meta["arrays"]}
+        self.kind = self.meta["kind"]
+
+    def predict(self, X):
+        a = self.a
+        X = np.asarray(X, dtype=np.float32)
+        if self.meta["scaled"]:
+            # StandardScaler.transform: in-place float32 ops with float64 statistics
+            X = X.copy()
+            X -= a["scaler_mean"]
+            X /= a["scaler_scale"]
+        if self.kind == "linear":
+            scores = X @ a["coef"].T + a["intercept"]
+        elif self.kind == "forest":
+            scores = self._forest_proba(X)
+        else:
+            scores = self._mlp_forward(X)
+        return a["classes"][scores.argmax(axis=1)]
+
+    def _forest_proba(self, X):
+        a = self.a
+        feature, threshold, left, right = a["feature"], a["threshold"], a["left"], a["right"]
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(a["roots"], (len(X), len(a["roots"])))
+        for _ in range(self.meta["depth"]):
+            go_left = X[rows, feature[node]] <= threshold[node]
+            node = np.where(go_left, left[node], right[node])
+        # Trees are added one after another, as sklearn accumulates them
+        value = a["value"]
+        proba = np.zeros((len(X), value.shape[1]), dtype=np.float64)
+        for t in range(node.shape[1]):
+            proba += value[node[:, t]]
+        proba /= node.shape[1]
+        return proba
+
+    def _mlp_forward(self, X):
+        a = self.a
+        n = self.meta["n_layers"]
+        act = X
+        for i in range(n):
+            act = act @ a[f"coef_{i}"]
+            act += a[f"intercept_{i}"]
+            if i != n - 1:
+                np.maximum(act, 0, out=act)
+        tmp = act - act.max(axis=1)[:, np.newaxis]
+        np.exp(tmp, out=act)
+        act /= act.sum(axis=1)[:, np.newaxis]
+        return act
+
+
+class CompiledPolicyPlayer(game.Player):
+    def __init__(self, path):
+        self.policy = CompiledPolicy(path)
+
+    def decide(self, state):
+        x = np.array([game.state_to_feature(state)], dtype=np.float32)
+        return int(self.policy.predict(x)[0])
+
+    def decide_batch(self, states):
+        return self.policy.predict(states.features())
+
+
+if __name__ == "__main__":
+    # python compiled_policy.py models/policy_rf.joblib [out_dir]
+    import joblib
+    src = sys.argv[1]
+    dst = sys.argv[2] if len(sys.argv) > 2 else os.path.splitext(src)[0]
+    export_policy(joblib.load(src), dst)
+    print(f"Exported {src} to {dst}")
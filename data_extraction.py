@@ -1,9 +1,17 @@
+import os
+import json
+import multiprocessing as mp
 import game
 from baseline_player import TBaselinePlayer, RandomPlayer, RolloutPlayer
+from replay import ReplayWriter, ReplayLog
+from vec_game import VecGame
 import random
 from tqdm.auto import tqdm
 import numpy as np
 
+N_FEATURES = 21
+N_ACTIONS = 8
+
 
 def build_player_pool(n_tbase, seed):
     rng = random.Random(seed)
@@ -42,19 +50,208 @@ def collect_data(players, rounds=200000, seed=92122):
     return features, strategies
 
 
-player_pool = build_player_pool(100, 92122)
-X_all, y_all = collect_data(players=player_pool, rounds=50000)
-X_np = np.array(X_all, dtype=np.float32)
-bad = []
-for i, a in enumerate(y_all):
-    if not isinstance(a, (int, np.integer)):
-        bad.append((i, type(a), a))
-        break
+class RowBuffer:
+    """Preallocated float32 feature / int8 action rows, grown by doubling when full."""
+
+    def __init__(self, capacity=4096):
+        self.X = np.empty((capacity, N_FEATURES), dtype=np.float32)
+        self.y = np.empty(capacity, dtype=np.int8)
+        self.n = 0
+
+    def extend(self, rows, actions):
+        k = len(actions)
+        if self.n + k > len(self.y):
+            cap = max(2 * len(self.y), self.n + k)
+            self.X = np.resize(self.X, (cap, N_FEATURES))
+            self.y = np.resize(self.y, cap)
+        if k:
+            self.X[self.n:self.n + k] = rows
+            self.y[self.n:self.n + k] = actions
+            self.n += k
+
+
+def collect_shard(players, index, rounds, seed, replay=None):
+    """
+    Same sampling scheme as collect_data for `rounds` rounds, driven by the sub-stream
+    (seed, index) so a shard's content does not depend on which worker produced it.
+    With a replay.ReplayWriter every game is also logged for later re-featurization.
+    """
+    rng = random.Random(f"{seed}/{index}")
+    buf = RowBuffer(rounds * 32)
+    trajectory = game.TrajectoryBuffer()
+    for _ in range(rounds):
+        # Same draws as rng.choices(players, k=2), as pool indices for the replay log
+        i1, i2 = rng.choices(range(len(players)), k=2)
+        player1, player2 = players[i1], players[i2]
+        player_seed = rng.getrandbits(32)
+        player1.new_game(player_seed)
+        player2.new_game(player_seed)
+        for begin in range(2):
+            chamber_seed = rng.randint(0, 100000)
+            env = dict(real=rng.randint(1, 10), fake=rng.randint(1, 10), heal=rng.randint(0, 2),
+                       reveal=rng.randint(0, 2), damage_per_shot=int(100 / rng.randint(2, 10)) + 1,
+                       skip_round=rng.randint(0, 2), skip_bullet=rng.randint(0, 2),
+                       double=rng.randint(0, 2), begin=begin, reveal_random=1)
+            reveal_seed = rng.getrandbits(32)
+            state = game.init_game(seed=chamber_seed, reveal_seed=reveal_seed, **env)
+            res, _, f, s = game.run_game(state, player1, player2, record="arrays", buffer=trajectory)
+            winner = 1 if res < 0 else 0
+            buf.extend(f[winner], s[winner])
+            keep = 1 << winner
+            if rng.random() > 0.5 and (not isinstance(player1, RandomPlayer)) and (not isinstance(player2, RandomPlayer)):
+                buf.extend(f[winner ^ 1], s[winner ^ 1])
+                keep |= 1 << (winner ^ 1)
+            if replay is not None:
+                replay.add(chamber_seed, reveal_seed, env, (i1, i2), trajectory.sequence(), winner, keep)
+    return buf.X[:buf.n], buf.y[:buf.n]
+
+
+def _save_npy(path, arr):
+    tmp = path + ".tmp.npy"
+    np.save(tmp, arr)
+    os.replace(tmp, path)
+
+
+def _write_manifest(out_dir, manifest):
+    path = os.path.join(out_dir, "manifest.json")
+    with open(path + ".tmp", "w") as fh:
+        json.dump(manifest, fh, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+def load_manifest(out_dir):
+    path = os.path.join(out_dir, "manifest.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as fh:
+        return json.load(fh)
+
+
+_SHARD_WORKER = {}
+
+
+def _init_shard_worker(players, out_dir, rounds_per_shard, seed):
+    _SHARD_WORKER.update(players=players, out_dir=out_dir, rounds_per_shard=rounds_per_shard, seed=seed)
+
+
+def _shard_worker(index):
+    w = _SHARD_WORKER
+    replay = ReplayWriter()
+    X, y = collect_shard(w["players"], index, w["rounds_per_shard"], w["seed"], replay=replay)
+    entry = {"index": index, "X": f"X_{index:05d}.npy", "y": f"y_{index:05d}.npy",
+             "replay": f"replay_{index:05d}.npz", "rows": len(y)}
+    _save_npy(os.path.join(w["out_dir"], entry["X"]), X)
+    _save_npy(os.path.join(w["out_dir"], entry["y"]), y)
+    tmp = os.path.join(w["out_dir"], entry["replay"] + ".tmp.npz")
+    replay.save(tmp)
+    os.replace(tmp, os.path.join(w["out_dir"], entry["replay"]))
+    return entry
+
+
+def collect_sharded(out_dir, rounds=200000, seed=92122, n_tbase=100, pool_seed=92122,
+                    rounds_per_shard=1000, n_workers=None):
+    """
+    Parallel, resumable version of collect_data.
+
+    Rounds are cut into shards of `rounds_per_shard`; each shard is written to
+    out_dir/X_#####.npy (float32), y_#####.npy (int8) and the replay log replay_#####.npz,
+    and recorded in manifest.json once the files are on disk. Re-running with the same
+    arguments skips the shards already in the manifest, so a crashed run picks up where
+    it stopped.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    config = {"rounds": rounds, "seed": seed, "n_tbase": n_tbase, "pool_seed": pool_seed,
+              "rounds_per_shard": rounds_per_shard, "n_features": N_FEATURES}
+    manifest = load_manifest(out_dir)
+    if manifest is None:
+        manifest = {"config": config, "shards": []}
+    elif manifest["config"] != config:
+        raise ValueError(f"{out_dir} holds a collection with a different config: {manifest['config']}")
+
+    if rounds % rounds_per_shard:
+        raise ValueError("rounds must be a multiple of rounds_per_shard")
+    n_shards = rounds // rounds_per_shard
+    done = {s["index"] for s in manifest["shards"]}
+    todo = [j for j in range(n_shards) if j not in done]
+    if not todo:
+        return manifest
+
+    players = build_player_pool(n_tbase, pool_seed)
+    n_workers = n_workers or os.cpu_count() or 1
+    with mp.Pool(n_workers, initializer=_init_shard_worker,
+                 initargs=(players, out_dir, rounds_per_shard, seed)) as pool:
+        for entry in tqdm(pool.imap_unordered(_shard_worker, todo), total=len(todo),
+                          desc="Collecting play data"):
+            manifest["shards"].append(entry)
+            manifest["shards"].sort(key=lambda s: s["index"])
+            _write_manifest(out_dir, manifest)
+    return manifest
+
+
+def load_shards(out_dir):
+    # Concatenate every shard into memory (only for datasets that fit in RAM)
+    manifest = load_manifest(out_dir)
+    X = np.concatenate([np.load(os.path.join(out_dir, s["X"])) for s in manifest["shards"]])
+    y = np.concatenate([np.load(os.path.join(out_dir, s["y"])) for s in manifest["shards"]])
+    return X, y
+
+
+def refeaturize_shards(out_dir, extractor=VecGame.features, batch_size=4096):
+    """Yield (X, y) per shard rebuilt from the replay logs, with features from `extractor`."""
+    for s in load_manifest(out_dir)["shards"]:
+        yield ReplayLog(os.path.join(out_dir, s["replay"])).featurize_all(extractor, batch_size)
+
+
+def compact_rows(X, y):
+    """Unique feature rows of (X, y) and how often each action was taken there: (X_unique, counts (U, 8))."""
+    X_unique, inverse = np.unique(X, axis=0, return_inverse=True)
+    counts = np.zeros((len(X_unique), N_ACTIONS), dtype=np.int32)
+    np.add.at(counts, (inverse.ravel(), y.astype(np.int64)), 1)
+    return X_unique, counts
+
+
+def merge_compact(parts):
+    # Combine several (X_unique, counts) pairs, summing the counts of rows they share
+    X = np.concatenate([p[0] for p in parts])
+    counts = np.concatenate([p[1] for p in parts])
+    X_unique, inverse = np.unique(X, axis=0, return_inverse=True)
+    merged = np.zeros((len(X_unique), N_ACTIONS), dtype=np.int32)
+    np.add.at(merged, inverse.ravel(), counts)
+    return X_unique, merged
+
+
+def compact_shards(out_dir, merge_every=50):
+    """
+    Compact a collect_sharded() directory one shard at a time: every shard is reduced to
+    its unique rows, and the partial results are merged every `merge_every` shards so
+    memory stays close to the size of the compact dataset.
+    """
+    manifest = load_manifest(out_dir)
+    compact = None
+    pending = []
+    for s in manifest["shards"]:
+        pending.append(compact_rows(np.load(os.path.join(out_dir, s["X"])), np.load(os.path.join(out_dir, s["y"]))))
+        if len(pending) == merge_every:
+            compact = merge_compact(pending if compact is None else [compact] + pending)
+            pending = []
+    if pending:
+        compact = merge_compact(pending if compact is None else [compact] + pending)
+    return compact
+
+
+def save_compact(path, X, counts):
+    # Same .npz layout as the raw dataset with `counts` in place of `y`; the mostly-zero counts compress well
+    np.savez_compressed(path, X=X, counts=counts)
 
-print("First bad y:", bad[0] if bad else "None")
 
-y_np = np.array(y_all, dtype=np.int64)
-counts = np.bincount(y_np, minlength=8)
-print(counts, counts / counts.sum())
-print(len(X_np))
-np.savez("data/dataset_v1.npz", X=X_np, y=y_np)
+if __name__ == "__main__":
+    collect_sharded("data/dataset_v1", rounds=50000, seed=92122, n_tbase=100, pool_seed=92122)
+    X_np, y_np = load_shards("data/dataset_v1")
+    y_np = y_np.astype(np.int64)
+    counts = np.bincount(y_np, minlength=8)
+    print(counts, counts / counts.sum())
+    print(len(X_np))
+    np.savez("data/dataset_v1.npz", X=X_np, y=y_np)
+    X_c, counts_c = compact_shards("data/dataset_v1")
+    save_compact("data/dataset_v1_compact.npz", X_c, counts_c)
+    print(f"Compact: {len(X_c)} unique rows for {counts_c.sum()} samples")
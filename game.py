@@ -1,178 +1,484 @@
-import copy
 import random
 import abc
+import time
+import numpy as np
 
 rng_global = random.Random(77)
 
+# Field order of GameState.pack(): scalars first, then the two-element per-player lists
+PACK_SCALARS = ("live", "n_rounds", "pos", "Left_real", "Left_fake", "max_hp", "damage_per_shot",
+                "skip_round_mark", "double_mark", "turn")
+PACK_PAIRS = ("revealed", "hp", "heal_left", "reveal_left", "random_reveal_left", "skip_bullet_left",
+              "skip_round_left", "double_left", "illegal_move")
+
 class Player(metaclass=abc.ABCMeta):
     all_type = 'file'
 
+    @property
+    def label(self):
+        # Name used for this player in instrumentation output
+        return type(self).__name__
+
     @abc.abstractmethod
     def decide(self, state):
         pass
 
+    def new_game(self, seed):
+        # Called with the game seed before each evaluation game; players with their own
+        # RNG reseed here so a game's result does not depend on which games ran before it
+        pass
+
+
+class GameState:
+    """
+    Compact game state.
+
+    The chamber is stored as bitmasks: bit i of `live` is set when round i is live, and
+    bit i of `revealed[p]` is set once player p has seen round i. Per-player counters are
+    two-element lists indexed by player id, so `clone()` only copies a handful of ints
+    and small lists instead of a nested structure.
+
+    `rng` drives random reveals. It is the shared `rng_global` unless the game was created
+    with its own `reveal_seed`; clones share it with the original.
+
+    Item access (`state["hp"]`) is kept for code written against the old dict state.
+    """
+    __slots__ = ("live", "revealed", "n_rounds", "pos", "Left_real", "Left_fake", "hp", "max_hp",
+                 "damage_per_shot", "heal_left", "reveal_left", "random_reveal_left", "skip_bullet_left",
+                 "skip_round_left", "double_left", "skip_round_mark", "double_mark", "turn", "illegal_move", "rng")
+
+    def clone(self):
+        st = GameState.__new__(GameState)
+        st.live = self.live
+        st.revealed = self.revealed[:]
+        st.n_rounds = self.n_rounds
+        st.pos = self.pos
+        st.Left_real = self.Left_real
+        st.Left_fake = self.Left_fake
+        st.hp = self.hp[:]
+        st.max_hp = self.max_hp
+        st.damage_per_shot = self.damage_per_shot
+        st.heal_left = self.heal_left[:]
+        st.reveal_left = self.reveal_left[:]
+        st.random_reveal_left = self.random_reveal_left[:]
+        st.skip_bullet_left = self.skip_bullet_left[:]
+        st.skip_round_left = self.skip_round_left[:]
+        st.double_left = self.double_left[:]
+        st.skip_round_mark = self.skip_round_mark
+        st.double_mark = self.double_mark
+        st.turn = self.turn
+        st.illegal_move = self.illegal_move[:]
+        st.rng = self.rng
+        return st
+
+    def pack(self):
+        # Flat tuple of ints (no rng), under 100 bytes pickled, for shipping states to worker processes
+        return (tuple(getattr(self, name) for name in PACK_SCALARS)
+                + tuple(v for name in PACK_PAIRS for v in getattr(self, name)))
+
+    @classmethod
+    def unpack(cls, packed, rng=None):
+        st = cls.__new__(cls)
+        n = len(PACK_SCALARS)
+        for name, v in zip(PACK_SCALARS, packed):
+            setattr(st, name, v)
+        for k, name in enumerate(PACK_PAIRS):
+            setattr(st, name, [packed[n + 2 * k], packed[n + 2 * k + 1]])
+        st.rng = rng_global if rng is None else rng
+        return st
+
+    def is_live(self, i):
+        return (self.live >> i) & 1
+
+    def is_revealed(self, i, player):
+        return (self.revealed[player] >> i) & 1
+
+    @property
+    def chamber(self):
+        # Read-only view in the old [[live], [revealed_0, revealed_1]] layout
+        return [[[self.is_live(i)], [self.is_revealed(i, 0), self.is_revealed(i, 1)]]
+                for i in range(self.n_rounds)]
 
-def init_game(seed=42, damage_per_shot=34, real=5, fake=5, heal=1, reveal=1, skip_bullet=1, double=1, skip_round=1, begin=None, reveal_random=1):
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
+
+    def __len__(self):
+        return self.n_rounds
+
+
+def init_game(seed=42, damage_per_shot=34, real=5, fake=5, heal=1, reveal=1, skip_bullet=1, double=1, skip_round=1, begin=None, reveal_random=1, reveal_seed=None):
     rng = random.Random(seed)
-    chamber = [[[1], [0,0]] for _ in range(real)] + [[[0], [0,0]] for _ in range(fake)]
+    chamber = [1] * real + [0] * fake
     rng.shuffle(chamber)
-    state = {
-        "chamber": chamber,
-        "pos": 0,
-        "Left_real": real,
-        "Left_fake": fake,
-        "hp": [100, 100],
-        "max_hp": 100,
-        "damage_per_shot": damage_per_shot,
-        "heal_left": [heal, heal],
-        "reveal_left": [reveal, reveal],
-        "random_reveal_left": [reveal_random, reveal_random],
-        "skip_bullet_left": [skip_bullet, skip_bullet],
-        "skip_round_left": [skip_round, skip_round],
-        "double_left": [double, double],
-        "skip_round_mark": 0,
-        "double_mark": 0,
-        "turn": rng.randint(0, 1) if begin is None else begin % 2,
-        "illegal_move": [0, 0],
-    }
+    state = GameState()
+    state.live = sum(1 << i for i, b in enumerate(chamber) if b)
+    state.revealed = [0, 0]
+    state.n_rounds = real + fake
+    state.pos = 0
+    state.Left_real = real
+    state.Left_fake = fake
+    state.hp = [100, 100]
+    state.max_hp = 100
+    state.damage_per_shot = damage_per_shot
+    state.heal_left = [heal, heal]
+    state.reveal_left = [reveal, reveal]
+    state.random_reveal_left = [reveal_random, reveal_random]
+    state.skip_bullet_left = [skip_bullet, skip_bullet]
+    state.skip_round_left = [skip_round, skip_round]
+    state.double_left = [double, double]
+    state.skip_round_mark = 0
+    state.double_mark = 0
+    state.turn = rng.randint(0, 1) if begin is None else begin % 2
+    state.illegal_move = [0, 0]
+    state.rng = rng_global if reveal_seed is None else random.Random(reveal_seed)
     return state
 
 
+def sample_live(state, player, rng):
+    """
+    `live` bitmask with the rounds `player` has not seen redrawn from the public counts
+    (Left_real / Left_fake minus what the player has seen), shuffled with `rng`.
+    """
+    seen = state.revealed[player]
+    unknown = []
+    live_seen = blank_seen = 0
+    for i in range(state.pos, state.n_rounds):
+        if (seen >> i) & 1:
+            if (state.live >> i) & 1:
+                live_seen += 1
+            else:
+                blank_seen += 1
+        else:
+            unknown.append(i)
+    # The pool may be larger than the unknown rounds: skipped bullets still count in Left_*
+    pool = [1] * max(state.Left_real - live_seen, 0) + [0] * max(state.Left_fake - blank_seen, 0)
+    rng.shuffle(pool)
+    pool.extend([0] * (len(unknown) - len(pool)))
+    live = state.live
+    for i, b in zip(unknown, pool):
+        live = live | (1 << i) if b else live & ~(1 << i)
+    return live
+
+
+def reveal_seed_for(seed):
+    # Seed of a game's own random-reveal stream, kept apart from its chamber seed
+    return f"{seed}/reveal"
+
+
 def use_reveal(state):
-    if state["pos"] >= len(state["chamber"]):
+    if state.pos >= state.n_rounds:
         raise Exception("Trying to reveal a bullet out of range... There must be a bug!")
-    if state["reveal_left"][state["turn"]] > 0:
-        state["chamber"][state["pos"]][1][state["turn"]] = 1
-        state["reveal_left"][state["turn"]] -= 1
+    if state.reveal_left[state.turn] > 0:
+        state.revealed[state.turn] |= 1 << state.pos
+        state.reveal_left[state.turn] -= 1
     else:
         illegal_penalty(state)
 
 def use_reveal_random(state):
-    if state["pos"] >= len(state["chamber"]):
+    if state.pos >= state.n_rounds:
         raise Exception("Trying to reveal a bullet out of range... There must be a bug!")
-    if state["random_reveal_left"][state["turn"]] > 0:
-        if state["pos"] == len(state["chamber"]) - 1:
-            state["chamber"][state["pos"]][1][state["turn"]] = 1
+    if state.random_reveal_left[state.turn] > 0:
+        if state.pos == state.n_rounds - 1:
+            state.revealed[state.turn] |= 1 << state.pos
         else:
-            state["chamber"][rng_global.randint(state["pos"]+1, len(state["chamber"])-1)][1][state["turn"]] = 1
-        state["random_reveal_left"][state["turn"]] -= 1
+            state.revealed[state.turn] |= 1 << state.rng.randint(state.pos + 1, state.n_rounds - 1)
+        state.random_reveal_left[state.turn] -= 1
     else:
         illegal_penalty(state)
 
 def use_heal(state):
-    if state["heal_left"][state["turn"]] > 0:
-        state["hp"][state["turn"]] = min(state["hp"][state["turn"]] + state["damage_per_shot"], state["max_hp"])
-        state["heal_left"][state["turn"]] -= 1
+    if state.heal_left[state.turn] > 0:
+        state.hp[state.turn] = min(state.hp[state.turn] + state.damage_per_shot, state.max_hp)
+        state.heal_left[state.turn] -= 1
     else:
         illegal_penalty(state)
 
 def use_skip_round(state):
-    if state["skip_round_left"][state["turn"]] > 0:
-        state["skip_round_mark"] = 1
-        state["skip_round_left"][state["turn"]] -= 1
+    if state.skip_round_left[state.turn] > 0:
+        state.skip_round_mark = 1
+        state.skip_round_left[state.turn] -= 1
     else:
         illegal_penalty(state)
 
 def use_skip_bullet(state):
-    if state["skip_bullet_left"][state["turn"]] > 0:
-        state["pos"] += 1
-        state["skip_bullet_left"][state["turn"]] -= 1
+    if state.skip_bullet_left[state.turn] > 0:
+        state.pos += 1
+        state.skip_bullet_left[state.turn] -= 1
     else:
         illegal_penalty(state)
 
 def use_double(state):
-    if state["double_left"][state["turn"]] > 0:
-        state["double_mark"] = 1
-        state["double_left"][state["turn"]] -= 1
+    if state.double_left[state.turn] > 0:
+        state.double_mark = 1
+        state.double_left[state.turn] -= 1
     else:
         illegal_penalty(state)
 def game_finish(state):
-    hp = state["hp"]
+    hp = state.hp
     return -1 if hp[0] <= 0 else 1 if hp[1] <= 0 else 0
 
 
 def shot(state, goal):
     # goal: 0 to self, 1 to opponent
-    if state["pos"] >= len(state["chamber"]):
+    if state.pos >= state.n_rounds:
         raise Exception("Trying to shoot a bullet out of range... There must be a bug!")
-    if state["chamber"][state["pos"]][0][0] == 1:
-        state["hp"][state["turn"] ^ goal] -= state["damage_per_shot"] * (state["double_mark"] + 1)
-        state["turn"] ^= 1 ^ state["skip_round_mark"]
-        state["skip_round_mark"] = 0
-        state["Left_real"] -= 1
+    if (state.live >> state.pos) & 1:
+        state.hp[state.turn ^ goal] -= state.damage_per_shot * (state.double_mark + 1)
+        state.turn ^= 1 ^ state.skip_round_mark
+        state.skip_round_mark = 0
+        state.Left_real -= 1
     else:
         if goal == 1:
-            state["turn"] ^= 1 ^ state["skip_round_mark"]
-            state["skip_round_mark"] = 0
-        state["Left_fake"] -= 1
-    state["pos"] += 1
-    state["double_mark"] = 0
+            state.turn ^= 1 ^ state.skip_round_mark
+            state.skip_round_mark = 0
+        state.Left_fake -= 1
+    state.pos += 1
+    state.double_mark = 0
 
 
 def check_finish(state):
-    if state["hp"][0] <= 0 or state["hp"][1] <= 0 or state["pos"] >= len(state["chamber"]):
-        return state["hp"][0] - state["hp"][1]
+    if state.hp[0] <= 0 or state.hp[1] <= 0 or state.pos >= state.n_rounds:
+        return state.hp[0] - state.hp[1]
     else:
         return None  # Continue
 
 
 def illegal_penalty(state):
-    state["hp"][state["turn"]] -= state["damage_per_shot"]
-    state["illegal_move"][state["turn"]] += 1
-    state["turn"] ^= 1
+    state.hp[state.turn] -= state.damage_per_shot
+    state.illegal_move[state.turn] += 1
+    state.turn ^= 1
+
+
+# Per-player item counter spent by each item action
+ITEM_COUNTERS = {2: "heal_left", 3: "reveal_left", 4: "double_left", 5: "skip_round_left",
+                 6: "skip_bullet_left", 7: "random_reveal_left"}
 
 
-def run_game(state, player1: Player, player2: Player):
+def apply_action(state, action):
+    if action == 0:
+        shot(state, 0)
+    elif action == 1:
+        shot(state, 1)
+    elif action == 2:
+        use_heal(state)
+    elif action == 3:
+        use_reveal(state)
+    elif action == 4:
+        use_double(state)
+    elif action == 5:
+        use_skip_round(state)
+    elif action == 6:
+        use_skip_bullet(state)
+    elif action == 7:
+        use_reveal_random(state)
+    else:
+        illegal_penalty(state)
+
+
+def do_action(state, action):
+    """
+    apply_action() that returns an undo record for undo(), so a search can walk one state
+    down and back up instead of cloning it at every node.
+
+    The record is a flat tuple of everything any action (or its illegal-move penalty) can
+    change for the player to move. Random reveals still advance state.rng; undo does not
+    rewind it.
+    """
+    t = state.turn
+    counter = ITEM_COUNTERS.get(action)
+    record = (action, t, state.pos, state.Left_real, state.Left_fake, state.hp[0], state.hp[1],
+              state.revealed[t], state.illegal_move[t], state.skip_round_mark, state.double_mark,
+              getattr(state, counter)[t] if counter else 0)
+    apply_action(state, action)
+    return record
+
+
+def undo(state, record):
+    action, t, pos, real, fake, hp0, hp1, revealed, illegal, skip_round_mark, double_mark, count = record
+    state.turn = t
+    state.pos = pos
+    state.Left_real = real
+    state.Left_fake = fake
+    state.hp[0] = hp0
+    state.hp[1] = hp1
+    state.revealed[t] = revealed
+    state.illegal_move[t] = illegal
+    state.skip_round_mark = skip_round_mark
+    state.double_mark = double_mark
+    counter = ITEM_COUNTERS.get(action)
+    if counter:
+        getattr(state, counter)[t] = count
+
+
+class TrajectoryBuffer:
+    """
+    Reusable per-player feature / action arrays for run_game(record="arrays").
+
+    reset() sizes them for a game (every round plus every item, per player) and only
+    reallocates when a game needs more room than any before it, so one buffer can serve
+    a whole collection run. Illegal moves can exceed that estimate; rows then grow by doubling.
+    """
+    N_FEATURES = 21
+
+    def __init__(self, capacity=32):
+        self.X = np.empty((2, capacity, self.N_FEATURES), dtype=np.float32)
+        self.y = np.empty((2, capacity), dtype=np.int8)
+        self.movers = np.empty(2 * capacity, dtype=np.int8)   # player to move at each step
+        self.n = [0, 0]
+
+    def reset(self, state):
+        items = max(sum(getattr(state, name)[p] for name in ITEM_COUNTERS.values()) for p in (0, 1))
+        self._reserve(state.n_rounds + items)
+        self.n[0] = self.n[1] = 0
+
+    def _reserve(self, capacity):
+        if capacity > self.y.shape[1]:
+            X, y = self.X, self.y
+            self.X = np.empty((2, capacity, self.N_FEATURES), dtype=np.float32)
+            self.y = np.empty((2, capacity), dtype=np.int8)
+            self.X[:, :X.shape[1]] = X
+            self.y[:, :y.shape[1]] = y
+            movers = self.movers
+            self.movers = np.empty(2 * capacity, dtype=np.int8)
+            self.movers[:len(movers)] = movers
+
+    def append(self, player, features, action):
+        i = self.n[player]
+        if i == self.y.shape[1]:
+            self._reserve(2 * i)
+        self.X[player, i] = features
+        self.y[player, i] = action
+        self.movers[self.n[0] + self.n[1]] = player
+        self.n[player] = i + 1
+
+    def features(self):
+        # Views into the buffer: valid until the next reset()
+        return [self.X[p, :self.n[p]] for p in (0, 1)]
+
+    def actions(self):
+        return [self.y[p, :self.n[p]] for p in (0, 1)]
+
+    def sequence(self):
+        # Both players' actions interleaved in play order
+        movers = self.movers[:self.n[0] + self.n[1]]
+        seq = np.empty(len(movers), dtype=np.int8)
+        for p in (0, 1):
+            seq[movers == p] = self.y[p, :self.n[p]]
+        return seq
+
+
+def run_game(state, player1: Player, player2: Player, record="lists", buffer=None, collector=None):
+    """
+    Play to the end and return (hp0 - hp1, final state, features, actions), with features
+    and actions split per player.
+
+    record="lists" (default) collects them as Python lists, "arrays" writes them into
+    `buffer` (a TrajectoryBuffer, reused across calls) and returns views into it, and
+    "none" skips featurization and returns None for both.
+
+    With an instrumentation.Collector the game runs through a timed copy of the loop;
+    the loops below are untouched, so leaving it out costs nothing.
+    """
     players = [player1, player2]
+    if collector is not None:
+        return _run_game_instrumented(state, players, record, buffer, collector)
+    if record == "none":
+        while check_finish(state) is None:
+            apply_action(state, players[state.turn].decide(state))
+        return check_finish(state), state, None, None
+
+    if record == "arrays":
+        if buffer is None:
+            buffer = TrajectoryBuffer()
+        buffer.reset(state)
+        while check_finish(state) is None:
+            features = state_to_feature(state)
+            strategy = players[state.turn].decide(state)
+            buffer.append(state.turn, features, strategy)
+            apply_action(state, strategy)
+        return check_finish(state), state, buffer.features(), buffer.actions()
+
+    if record != "lists":
+        raise ValueError(f"Unknown record mode: {record}")
     strategy_list = [[],[]]
     state_list = [[],[]]
     while check_finish(state) is None:
-        state_list[state["turn"]].append(state_to_feature(state))
-        strategy = players[state["turn"]].decide(state)
-        strategy_list[state["turn"]].append(strategy)
-        if strategy == 0:  # shoot self
-            shot(state, 0)
-        elif strategy == 1:  # shoot opponent
-            shot(state, 1)
-        elif strategy == 2:  # heal
-            use_heal(state)
-        elif strategy == 3:  # reveal
-            use_reveal(state)
-        elif strategy == 4:  # double
-            use_double(state)
-        elif strategy == 5:
-            use_skip_round(state) # skip round
-        elif strategy == 6:
-            use_skip_bullet(state) # skip bullet
-        elif strategy == 7:
-            use_reveal_random(state) # random reveal
-        else:
-            illegal_penalty(state)
+        state_list[state.turn].append(state_to_feature(state))
+        strategy = players[state.turn].decide(state)
+        strategy_list[state.turn].append(strategy)
+        apply_action(state, strategy)
+    return check_finish(state), state, state_list, strategy_list
+
+
+def _run_game_instrumented(state, players, record, buffer, collector):
+    clock = time.perf_counter
+    labels = [p.label for p in players]
+    state_list = strategy_list = None
+    if record == "lists":
+        state_list, strategy_list = [[], []], [[], []]
+    elif record == "arrays":
+        if buffer is None:
+            buffer = TrajectoryBuffer()
+        buffer.reset(state)
+    elif record != "none":
+        raise ValueError(f"Unknown record mode: {record}")
+
+    n = 0
+    while check_finish(state) is None:
+        turn = state.turn
+        features = None
+        if record != "none":
+            t0 = clock()
+            features = state_to_feature(state)
+            collector.record_features(t0, clock())
+        t0 = clock()
+        strategy = players[turn].decide(state)
+        t1 = clock()
+        collector.record_decide(labels[turn], turn, t0, t1)
+        if record == "lists":
+            state_list[turn].append(features)
+            strategy_list[turn].append(strategy)
+        elif record == "arrays":
+            buffer.append(turn, features, strategy)
+        t1 = clock()
+        apply_action(state, strategy)
+        collector.record_action(strategy, turn, t1, clock())
+        n += 1
+
+    collector.record_game(n, state.illegal_move)
+    if record == "arrays":
+        state_list, strategy_list = buffer.features(), buffer.actions()
     return check_finish(state), state, state_list, strategy_list
 
 
 def state_to_feature(state):
-    pr_real = state["Left_real"] / (state["Left_real"] + state["Left_fake"] + 10 ** -10)
-    bullet = state["chamber"][state["pos"]][0][0] if state["chamber"][state["pos"]][1][0] == 1 else pr_real
-    hp = (state["hp"][state["turn"]]) / (state["max_hp"])
-    heal = 1 if state["heal_left"][state["turn"]] > 0 else 0
-    reveal = 1 if state["reveal_left"][state["turn"]] > 0 else 0
-    random_reveal = 1 if state["random_reveal_left"][state["turn"]] > 0 else 0
-    double = 1 if state["double_left"][state["turn"]] > 0 else 0
-    skip_round = 1 if state["skip_round_left"][state["turn"]] > 0 else 0
-    skip_bullet = 1 if state["skip_bullet_left"][state["turn"]] > 0 else 0
-    double_mark = state["double_mark"]
-    sr_mark = state["skip_round_mark"]
-    heal_opponent = 1 if state["heal_left"][state["turn"] ^ 1] > 0 else 0
-    reveal_opponent = 1 if state["reveal_left"][state["turn"] ^ 1] > 0 else 0
-    random_reveal_opponent = 1 if state["random_reveal_left"][state["turn"] ^ 1] > 0 else 0
-    double_opponent = 1 if state["double_left"][state["turn"] ^ 1] > 0 else 0
-    skip_round_opponent = 1 if state["skip_round_left"][state["turn"] ^ 1] > 0 else 0
-    skip_bullet_opponent = 1 if state["skip_bullet_left"][state["turn"] ^ 1] > 0 else 0
-    hp_opponent = (state["hp"][state["turn"] ^ 1]) / (state["max_hp"])
+    turn = state.turn
+    opp = turn ^ 1
+    pos = state.pos
+    pr_real = state.Left_real / (state.Left_real + state.Left_fake + 10 ** -10)
+    bullet = (state.live >> pos) & 1 if (state.revealed[0] >> pos) & 1 else pr_real
+    hp = (state.hp[turn]) / (state.max_hp)
+    heal = 1 if state.heal_left[turn] > 0 else 0
+    reveal = 1 if state.reveal_left[turn] > 0 else 0
+    random_reveal = 1 if state.random_reveal_left[turn] > 0 else 0
+    double = 1 if state.double_left[turn] > 0 else 0
+    skip_round = 1 if state.skip_round_left[turn] > 0 else 0
+    skip_bullet = 1 if state.skip_bullet_left[turn] > 0 else 0
+    double_mark = state.double_mark
+    sr_mark = state.skip_round_mark
+    heal_opponent = 1 if state.heal_left[opp] > 0 else 0
+    reveal_opponent = 1 if state.reveal_left[opp] > 0 else 0
+    random_reveal_opponent = 1 if state.random_reveal_left[opp] > 0 else 0
+    double_opponent = 1 if state.double_left[opp] > 0 else 0
+    skip_round_opponent = 1 if state.skip_round_left[opp] > 0 else 0
+    skip_bullet_opponent = 1 if state.skip_bullet_left[opp] > 0 else 0
+    hp_opponent = (state.hp[opp]) / (state.max_hp)
     uncertainty = 1 - (abs(pr_real - 0.5) * 2)
-    pos = state["pos"] / len(state["chamber"])
-    is_revealed = state["chamber"][state["pos"]][1][state["turn"]]
+    pos = pos / state.n_rounds
+    is_revealed = (state.revealed[turn] >> state.pos) & 1
     hp_diff = hp - hp_opponent
     return [bullet, hp, hp_opponent, heal, reveal, heal_opponent, reveal_opponent, uncertainty, pos, is_revealed,
             hp_diff, double, skip_round, skip_round_opponent, skip_bullet, skip_bullet_opponent, double_opponent,
@@ -0,0 +1,117 @@
+"""
+Opt-in timing and counting for game.run_game.
+
+Pass a Collector as run_game(..., collector=c) or play_many_games(..., collector=c).
+Without one, run_game takes its usual loop and nothing is measured.
+"""
+import os
+import json
+import time
+
+N_BUCKETS = 32       # latency bucket b holds durations in [2**(b-1), 2**b) microseconds
+N_ACTION_SLOTS = 9   # actions 0-7, then every other code
+
+
+def bucket(seconds):
+    return min(int(seconds * 1e6).bit_length(), N_BUCKETS - 1)
+
+
+class Collector:
+    """
+    Decide latency histograms per player label, time and count of the state mutation for
+    each action, featurization time, game lengths (decisions per game) and illegal moves
+    per seat. With trace=True it also keeps decide / action spans for a Chrome trace,
+    up to `max_events`. Span timestamps are relative to `origin` (a perf_counter value,
+    default now); collectors that will be merged should share one origin.
+    """
+
+    def __init__(self, trace=False, max_events=1000000, origin=None):
+        self.decide = {}     # label -> {"count", "seconds", "hist"}
+        self.action_count = [0] * N_ACTION_SLOTS
+        self.action_seconds = [0.0] * N_ACTION_SLOTS
+        self.feature_count = 0
+        self.feature_seconds = 0.0
+        self.game_lengths = {}   # decisions per game -> games
+        self.illegal = [0, 0]
+        self.games = 0
+        self.trace = trace
+        self.max_events = max_events
+        self.events = []
+        self.origin = time.perf_counter() if origin is None else origin
+
+    def record_decide(self, label, seat, t0, t1):
+        d = self.decide.get(label)
+        if d is None:
+            d = self.decide[label] = {"count": 0, "seconds": 0.0, "hist": [0] * N_BUCKETS}
+        d["count"] += 1
+        d["seconds"] += t1 - t0
+        d["hist"][bucket(t1 - t0)] += 1
+        if self.trace:
+            self._event(f"decide {label}", "decide", seat, t0, t1)
+
+    def record_action(self, action, seat, t0, t1):
+        slot = action if 0 <= action < N_ACTION_SLOTS - 1 else N_ACTION_SLOTS - 1
+        self.action_count[slot] += 1
+        self.action_seconds[slot] += t1 - t0
+        if self.trace:
+            self._event(f"action {action}", "action", seat, t0, t1)
+
+    def record_features(self, t0, t1):
+        self.feature_count += 1
+        self.feature_seconds += t1 - t0
+
+    def record_game(self, length, illegal_move):
+        self.games += 1
+        self.game_lengths[length] = self.game_lengths.get(length, 0) + 1
+        self.illegal[0] += illegal_move[0]
+        self.illegal[1] += illegal_move[1]
+
+    def _event(self, name, cat, seat, t0, t1):
+        if len(self.events) < self.max_events:
+            self.events.append({"name": name, "cat": cat, "ph": "X", "pid": os.getpid(), "tid": seat,
+                                "ts": (t0 - self.origin) * 1e6, "dur": (t1 - t0) * 1e6})
+
+    def merge(self, other):
+        # Add another collector's counts into this one (e.g. one per evaluation worker)
+        for label, d in other.decide.items():
+            mine = self.decide.setdefault(label, {"count": 0, "seconds": 0.0, "hist": [0] * N_BUCKETS})
+            mine["count"] += d["count"]
+            mine["seconds"] += d["seconds"]
+            mine["hist"] = [a + b for a, b in zip(mine["hist"], d["hist"])]
+        self.action_count = [a + b for a, b in zip(self.action_count, other.action_count)]
+        self.action_seconds = [a + b for a, b in zip(self.action_seconds, other.action_seconds)]
+        self.feature_count += other.feature_count
+        self.feature_seconds += other.feature_seconds
+        for length, n in other.game_lengths.items():
+            self.game_lengths[length] = self.game_lengths.get(length, 0) + n
+        self.illegal = [a + b for a, b in zip(self.illegal, other.illegal)]
+        self.games += other.games
+        self.events.extend(other.events[:max(self.max_events - len(self.events), 0)])
+        return self
+
+    def to_dict(self):
+        lengths = sorted(self.game_lengths.items())
+        n_decisions = sum(k * n for k, n in lengths)
+        return {
+            "games": self.games,
+            "decide": {label: {"count": d["count"], "mean_us": d["seconds"] / d["count"] * 1e6,
+                               "hist_us_upper": {2 ** b: n for b, n in enumerate(d["hist"]) if n}}
+                       for label, d in self.decide.items()},
+            "actions": {str(a) if a < N_ACTION_SLOTS - 1 else "other":
+                        {"count": n, "mean_us": s / n * 1e6}
+                        for a, (n, s) in enumerate(zip(self.action_count, self.action_seconds)) if n},
+            "features": {"count": self.feature_count,
+                         "mean_us": self.feature_seconds / self.feature_count * 1e6 if self.feature_count else 0.0},
+            "game_length": {"mean": n_decisions / self.games if self.games else 0.0,
+                            "hist": {k: n for k, n in lengths}},
+            "illegal": {"p0": self.illegal[0], "p1": self.illegal[1]},
+        }
+
+    def dump_json(self, path):
+        with open(path, "w") as fh:
+            json.dump(self.to_dict(), fh, indent=1)
+
+    def dump_chrome_trace(self, path):
+        # Load in chrome://tracing or Perfetto; requires trace=True
+        with open(path, "w") as fh:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, fh)
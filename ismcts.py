@@ -0,0 +1,141 @@
+import math
+import random
+import time
+import game
+from baseline_player import TBaselinePlayer, legal_actions, apply_action
+
+ITEMS = ("heal_left", "reveal_left", "random_reveal_left", "skip_bullet_left", "skip_round_left", "double_left")
+
+
+def public_key(state):
+    # Everything both players can see; the hidden chamber and private reveals are left out
+    return (state.turn, state.pos, state.Left_real, state.Left_fake, state.hp[0], state.hp[1],
+            state.double_mark, state.skip_round_mark) + tuple(tuple(getattr(state, name)) for name in ITEMS)
+
+
+def search_actions(state):
+    # legal_actions never offers the reveal (3); search it like solver.Solver.actions does:
+    # the mover has one left and has not seen the current round yet
+    acts = legal_actions(state)
+    t = state.turn
+    if state.reveal_left[t] > 0 and not (state.revealed[t] >> state.pos) & 1:
+        acts.insert(acts.index(1) + 1 + (2 in acts), 3)
+    return acts
+
+
+class Node:
+    __slots__ = ("key", "visits", "stats", "children")
+
+    def __init__(self, key):
+        self.key = key
+        self.visits = 0
+        self.stats = {}      # action -> [visits, total reward for the player to move]
+        self.children = {}   # (action, public key after the action) -> Node
+
+
+class ISMCTSPlayer(game.Player):
+    """
+    Single-observer information-set MCTS.
+
+    Every iteration samples a chamber consistent with what the deciding player has seen
+    (its own reveals and the public live/blank counts), then walks one shared tree whose
+    nodes are public information states: children are keyed by (action, public outcome),
+    so the opponent's moves are searched without using its private knowledge. Leaves are
+    finished with `rollout_policy`.
+
+    The tree is kept between decisions of the same game: the next decision re-roots at
+    the descendant whose public state matches the new position, if the search reached it.
+    A decision stops after `n_iterations` or `time_budget_ms`, whichever comes first.
+    """
+    def __init__(self, n_iterations=1000, time_budget_ms=None, c=0.5, seed=0, rollout_policy=None,
+                 reuse_tree=True, reuse_depth=8):
+        self.n_iterations = n_iterations
+        self.time_budget_ms = time_budget_ms
+        self.c = c
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.rollout_policy = rollout_policy if rollout_policy is not None else TBaselinePlayer(t_shoot=0.6, t_reveal=0.25, t_use=0.4)
+        self.reuse_tree = reuse_tree
+        self.reuse_depth = reuse_depth
+        self.root = None
+        self.reused = 0
+
+    def new_game(self, seed):
+        self.rng = random.Random(f"{self.seed}/{seed}")
+        self.root = None
+
+    def decide(self, state):
+        legal = search_actions(state)
+        if len(legal) == 1:
+            return legal[0]
+        root = self._find_root(public_key(state))
+        deadline = None
+        if self.time_budget_ms is not None:
+            deadline = time.perf_counter() + self.time_budget_ms / 1000
+
+        me = state.turn
+        for it in range(self.n_iterations):
+            if deadline is not None and it and time.perf_counter() > deadline:
+                break
+            self._iterate(root, self.determinize(state, me))
+
+        self.root = root
+        return max(legal, key=lambda a: root.stats.get(a, (0, 0.0))[0])
+
+    def _find_root(self, key):
+        if self.reuse_tree and self.root is not None:
+            frontier = [self.root]
+            for _ in range(self.reuse_depth):
+                for node in frontier:
+                    if node.key == key:
+                        self.reused += 1
+                        return node
+                frontier = [child for node in frontier for child in node.children.values()]
+                if not frontier:
+                    break
+        return Node(key)
+
+    def determinize(self, state, player):
+        # Resample the unseen rounds from the public counts, keeping `player`'s reveals
+        st = state.clone()
+        st.rng = random.Random(self.rng.getrandbits(64))
+        st.live = game.sample_live(state, player, self.rng)
+        return st
+
+    def _iterate(self, root, st):
+        node = root
+        path = []
+        while game.check_finish(st) is None:
+            legal = search_actions(st)
+            untried = [a for a in legal if a not in node.stats]
+            if untried:
+                a = untried[self.rng.randrange(len(untried))]
+                node.stats[a] = [0, 0.0]
+            else:
+                a = self._select(node, legal)
+            path.append((node, a, st.turn))
+            apply_action(st, a)
+            child_key = (a, public_key(st))
+            child = node.children.get(child_key)
+            if child is None:
+                node.children[child_key] = Node(child_key[1])
+                break
+            node = child
+
+        res, _, _, _ = game.run_game(st, self.rollout_policy, self.rollout_policy, record="none")
+        scale = 2 * st.max_hp
+        for node, a, mover in path:
+            node.visits += 1
+            s = node.stats[a]
+            s[0] += 1
+            s[1] += (res if mover == 0 else -res) / scale
+
+    def _select(self, node, legal):
+        log_n = math.log(node.visits + 1)
+        best_a, best_u = legal[0], -1e18
+        for a in legal:
+            n, total = node.stats[a]
+            u = total / n + self.c * math.sqrt(log_n / n)
+            if u > best_u:
+                best_a, best_u = a, u
+        return best_a
@@ -0,0 +1,293 @@
+"""
+Asyncio server that plays many games at once against agents in other processes.
+
+Agents connect over TCP on localhost, say HELLO with their name, and then answer batches
+of decisions. A match seats a connected agent (by name) or an in-process game.Player on
+each side; every match waiting on an agent adds one request to that agent's next batch.
+
+Protocol: frames are <u32 length><u8 type><body>, little-endian, length counting the
+type byte.
+
+    HELLO    agent -> server   body: agent name (utf-8)
+    DECIDE   server -> agent   body: u32 n, u32 tickets[n], i32 observations[n, OBS_LEN]
+    ACTIONS  agent -> server   body: u32 n, u32 tickets[n], i8 actions[n]
+    BYE      server -> agent   no body; the agent should disconnect
+
+An observation is GameState.pack() as seen by the player to move: unless the server
+was started with hide_private=False, live bits the mover has not revealed and the
+opponent's reveals are zeroed. Each agent has at most `max_inflight` unanswered
+requests and writes wait for the socket to drain, so a slow agent slows its own
+matches down rather than growing queues. A decision not answered within the match's
+`timeout` is played as an illegal move (game.illegal_penalty); a late answer is dropped.
+
+    python match_server.py bench [--matches N] [--timeout S] [--delay S]
+"""
+import copy
+import time
+import struct
+import asyncio
+import argparse
+import multiprocessing as mp
+import numpy as np
+import game
+from vec_game import VecGame
+
+HELLO, DECIDE, ACTIONS, BYE = range(4)
+HEADER = struct.Struct("<IB")
+COUNT = struct.Struct("<I")
+N_SCALARS = len(game.PACK_SCALARS)
+OBS_LEN = N_SCALARS + 2 * len(game.PACK_PAIRS)
+LIVE = game.PACK_SCALARS.index("live")
+REVEALED = N_SCALARS + 2 * game.PACK_PAIRS.index("revealed")
+
+
+def frame(kind, body=b""):
+    return HEADER.pack(len(body) + 1, kind) + body
+
+
+async def read_frame(reader):
+    length, kind = HEADER.unpack(await reader.readexactly(HEADER.size))
+    return kind, await reader.readexactly(length - 1)
+
+
+def observation(state, hide_private=True):
+    obs = list(state.pack())
+    if hide_private:
+        t = state.turn
+        obs[LIVE] = state.live & state.revealed[t]
+        obs[REVEALED + (t ^ 1)] = 0
+    return obs
+
+
+def decode_batch(body, width, dtype):
+    # (tickets, values) of a DECIDE / ACTIONS body; values have `width` columns
+    n = COUNT.unpack_from(body)[0]
+    tickets = np.frombuffer(body, dtype=np.uint32, count=n, offset=COUNT.size)
+    values = np.frombuffer(body, dtype=dtype, count=n * width, offset=COUNT.size + 4 * n)
+    return tickets, values.reshape(n, width) if width > 1 else values
+
+
+class Match:
+    def __init__(self, seed, seats, env=None, timeout=1.0):
+        # seats: (seat0, seat1), each an agent name or a game.Player
+        self.seed = seed
+        self.seats = seats
+        self.env = env or {}
+        self.timeout = timeout
+
+
+class AgentConnection:
+    def __init__(self, name, reader, writer, max_inflight, max_batch, hide_private):
+        self.name = name
+        self.reader = reader
+        self.writer = writer
+        self.max_batch = max_batch
+        self.hide_private = hide_private
+        self.inflight = asyncio.Semaphore(max_inflight)
+        self.pending = {}    # ticket -> future of the action
+        self.outbox = []     # (ticket, observation) not sent yet
+        self.wakeup = asyncio.Event()
+        self.next_ticket = 0
+        self.batches = 0
+        self.decisions = 0
+        self.tasks = [asyncio.create_task(self._send_loop()), asyncio.create_task(self._read_loop())]
+
+    async def decide(self, state, timeout):
+        """Action of the agent for `state`, or None if it did not answer in time."""
+        async with self.inflight:
+            ticket = self.next_ticket
+            self.next_ticket = (ticket + 1) & 0xFFFFFFFF
+            fut = asyncio.get_running_loop().create_future()
+            self.pending[ticket] = fut
+            self.outbox.append((ticket, observation(state, self.hide_private)))
+            self.wakeup.set()
+            try:
+                return await asyncio.wait_for(fut, timeout)
+            except asyncio.TimeoutError:
+                return None
+            finally:
+                self.pending.pop(ticket, None)
+
+    async def _send_loop(self):
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            # One more loop iteration lets every runnable match queue its request into this batch
+            await asyncio.sleep(0)
+            while self.outbox:
+                batch, self.outbox = self.outbox[:self.max_batch], self.outbox[self.max_batch:]
+                tickets = np.array([b[0] for b in batch], dtype=np.uint32)
+                obs = np.array([b[1] for b in batch], dtype=np.int32)
+                self.writer.write(frame(DECIDE, COUNT.pack(len(batch)) + tickets.tobytes() + obs.tobytes()))
+                self.batches += 1
+                self.decisions += len(batch)
+                await self.writer.drain()
+
+    async def _read_loop(self):
+        while True:
+            try:
+                kind, body = await read_frame(self.reader)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                # Agent gone: its pending decisions run into their timeouts
+                return
+            if kind != ACTIONS:
+                continue
+            tickets, actions = decode_batch(body, 1, np.int8)
+            for ticket, action in zip(tickets.tolist(), actions.tolist()):
+                fut = self.pending.get(ticket)
+                if fut is not None and not fut.done():
+                    fut.set_result(action)
+
+    async def close(self):
+        for task in self.tasks:
+            task.cancel()
+        try:
+            self.writer.write(frame(BYE))
+            await self.writer.drain()
+            self.writer.close()
+        except ConnectionError:
+            pass
+
+
+class MatchServer:
+    def __init__(self, host="127.0.0.1", port=0, max_inflight=4096, max_batch=1024, max_concurrent=10000,
+                 hide_private=True):
+        self.host = host
+        self.port = port
+        self.max_inflight = max_inflight
+        self.max_batch = max_batch
+        self.slots = asyncio.Semaphore(max_concurrent)
+        self.hide_private = hide_private
+        self.agents = {}
+        self.joined = asyncio.Condition()
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._on_connect, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def _on_connect(self, reader, writer):
+        kind, body = await read_frame(reader)
+        if kind != HELLO:
+            writer.close()
+            return
+        name = body.decode()
+        conn = AgentConnection(name, reader, writer, self.max_inflight, self.max_batch, self.hide_private)
+        async with self.joined:
+            self.agents[name] = conn
+            self.joined.notify_all()
+
+    async def wait_for_agents(self, names):
+        async with self.joined:
+            await self.joined.wait_for(lambda: all(n in self.agents for n in names))
+
+    async def play(self, matches):
+        """Play every match concurrently (up to max_concurrent at a time); results in match order."""
+        await self.wait_for_agents({s for m in matches for s in m.seats if isinstance(s, str)})
+        return await asyncio.gather(*(self._play_match(m) for m in matches))
+
+    async def _play_match(self, match):
+        async with self.slots:
+            st = game.init_game(seed=match.seed, reveal_seed=game.reveal_seed_for(match.seed), **match.env)
+            if st.n_rounds > 31:
+                raise ValueError("Observations are int32: chambers are limited to 31 rounds")
+            # In-process players get a shallow copy per match, reseeded for its seed, so
+            # concurrent matches do not share (or reset) one RNG stream
+            seats = [copy.copy(s) if isinstance(s, game.Player) else s for s in match.seats]
+            for seat in seats:
+                if isinstance(seat, game.Player):
+                    seat.new_game(match.seed)
+            timeouts = [0, 0]
+            moves = 0
+            while game.check_finish(st) is None:
+                seat = seats[st.turn]
+                moves += 1
+                if isinstance(seat, str):
+                    action = await self.agents[seat].decide(st, match.timeout)
+                    if action is None:
+                        timeouts[st.turn] += 1
+                        game.illegal_penalty(st)
+                        continue
+                else:
+                    action = seat.decide(st)
+                game.apply_action(st, action)
+            return {"seed": match.seed, "result": game.check_finish(st), "moves": moves,
+                    "illegal": list(st.illegal_move), "timeouts": timeouts}
+
+    async def close(self):
+        for conn in self.agents.values():
+            await conn.close()
+        self.server.close()
+        await self.server.wait_closed()
+
+
+def decide_many(player, states):
+    if hasattr(player, "decide_batch"):
+        return np.asarray(player.decide_batch(VecGame(states)))
+    return np.array([player.decide(s) for s in states])
+
+
+async def run_agent(name, player, host="127.0.0.1", port=0, delay=0.0):
+    """Stand-in agent: answers every DECIDE batch with `player`, `delay` seconds late."""
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(frame(HELLO, name.encode()))
+    await writer.drain()
+    batches = decisions = 0
+    while True:
+        try:
+            kind, body = await read_frame(reader)
+        except asyncio.IncompleteReadError:
+            break
+        if kind == BYE:
+            break
+        tickets, obs = decode_batch(body, OBS_LEN, np.int32)
+        actions = decide_many(player, [game.GameState.unpack(row) for row in obs.tolist()])
+        if delay:
+            await asyncio.sleep(delay)
+        writer.write(frame(ACTIONS, COUNT.pack(len(tickets)) + tickets.tobytes() + actions.astype(np.int8).tobytes()))
+        await writer.drain()
+        batches += 1
+        decisions += len(tickets)
+    writer.close()
+    return {"batches": batches, "decisions": decisions}
+
+
+def _agent_process(name, port, delay):
+    from baseline_player import BaselinePlayer
+    asyncio.run(run_agent(name, BaselinePlayer(), port=port, delay=delay))
+
+
+async def bench(n_matches, timeout, delay):
+    # Remote Baseline agent against an in-process TBaseline, canonical env
+    from baseline_player import TBaselinePlayer
+    from train_models import CANONICAL_ENV
+    server = MatchServer()
+    port = await server.start()
+    agent = mp.Process(target=_agent_process, args=("baseline", port, delay))
+    agent.start()
+    opponent = TBaselinePlayer(0.6, 0.25, 0.4)
+    matches = [Match(seed, ("baseline", opponent), CANONICAL_ENV, timeout) for seed in range(n_matches)]
+    t = time.perf_counter()
+    results = await server.play(matches)
+    elapsed = time.perf_counter() - t
+    conn = server.agents["baseline"]
+    await server.close()
+    agent.join()
+    wins = sum(r["result"] > 0 for r in results)
+    print(f"{n_matches} matches in {elapsed:.2f}s ({n_matches / elapsed:.0f}/s), "
+          f"{conn.decisions} agent decisions ({conn.decisions / elapsed:.0f}/s) "
+          f"in {conn.batches} batches (mean {conn.decisions / max(conn.batches, 1):.0f}), "
+          f"timeouts {sum(r['timeouts'][0] for r in results)}, agent win rate {wins / n_matches:.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Asyncio match server")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_bench = sub.add_parser("bench", help="play a local stand-in agent and report throughput")
+    p_bench.add_argument("--matches", type=int, default=5000)
+    p_bench.add_argument("--timeout", type=float, default=5.0)
+    p_bench.add_argument("--delay", type=float, default=0.0)
+    args = parser.parse_args()
+    if args.command == "bench":
+        asyncio.run(bench(args.matches, args.timeout, args.delay))
@@ -0,0 +1,130 @@
+"""
+Compact replay logs of collected games.
+
+A log stores, per game, what is needed to play it again: the env parameters, the
+chamber seed, the reveal seed, the pool indices of both players, which players' rows
+went into the dataset, and the actions in play order packed two to a byte. A game
+costs about 30 bytes plus half a byte per move, against 84+ bytes per feature row.
+
+ReplayLog rebuilds the games in batches on a VecGame and featurizes them with any
+extractor (a function of a VecGame returning one row per game), so changing the
+features means re-featurizing the logs rather than re-simulating the players.
+"""
+import numpy as np
+import game
+from vec_game import VecGame
+
+ENV_FIELDS = ("real", "fake", "heal", "reveal", "damage_per_shot", "skip_round", "skip_bullet", "double",
+              "reveal_random", "begin")
+INDEX_DTYPE = np.dtype([("seed", np.int64), ("reveal_seed", np.int64)]
+                       + [(name, np.int16) for name in ENV_FIELDS]
+                       + [("player0", np.int32), ("player1", np.int32),
+                          ("first", np.int8),     # player whose rows come first in the dataset
+                          ("keep", np.int8),      # bit p set: player p's rows are in the dataset
+                          ("offset", np.int64),   # start of the game's actions in `actions` (bytes)
+                          ("n_actions", np.int32)])
+ILLEGAL_CODE = 15   # every action outside 0-7 is stored as this (all are played as illegal moves)
+
+
+def pack_actions(actions):
+    a = np.asarray(actions, dtype=np.int64)
+    a = np.where((a >= 0) & (a <= 7), a, ILLEGAL_CODE).astype(np.uint8)
+    if len(a) % 2:
+        a = np.append(a, 0)
+    return a[0::2] | (a[1::2] << 4)
+
+
+def unpack_actions(packed, n):
+    out = np.empty(2 * len(packed), dtype=np.int64)
+    out[0::2] = packed & 15
+    out[1::2] = packed >> 4
+    return out[:n]
+
+
+class ReplayWriter:
+    def __init__(self):
+        self.rows = []
+        self.chunks = []
+        self.offset = 0
+
+    def add(self, seed, reveal_seed, env, players, actions, first, keep):
+        packed = pack_actions(actions)
+        self.rows.append((seed, reveal_seed) + tuple(env[name] for name in ENV_FIELDS)
+                         + (players[0], players[1], first, keep, self.offset, len(actions)))
+        self.chunks.append(packed)
+        self.offset += len(packed)
+
+    def save(self, path):
+        index = np.array(self.rows, dtype=INDEX_DTYPE)
+        actions = np.concatenate(self.chunks) if self.chunks else np.empty(0, dtype=np.uint8)
+        np.savez(path, index=index, actions=actions)
+
+
+def state_extractor(fn):
+    # Adapt a per-GameState feature function (like game.state_to_feature) to the extractor interface
+    return lambda states: np.array([fn(states.state(i)) for i in range(len(states))], dtype=np.float32)
+
+
+class ReplayLog:
+    """
+    Games of a log saved by ReplayWriter. featurize() yields (X, y) batches with the rows
+    of every game in the same order as the collection that wrote the log: the `first`
+    player's decisions, then the other player's if they were kept.
+    """
+
+    def __init__(self, path):
+        data = np.load(path)
+        self.index = data["index"]
+        self.actions = data["actions"]
+
+    def __len__(self):
+        return len(self.index)
+
+    def game_actions(self, i):
+        g = self.index[i]
+        return unpack_actions(self.actions[g["offset"]:g["offset"] + (g["n_actions"] + 1) // 2], g["n_actions"])
+
+    def initial_states(self, idx):
+        states = []
+        for g in self.index[idx]:
+            env = {name: int(g[name]) for name in ENV_FIELDS}
+            states.append(game.init_game(seed=int(g["seed"]), reveal_seed=int(g["reveal_seed"]), **env))
+        return states
+
+    def featurize(self, extractor=VecGame.features, batch_size=4096):
+        for start in range(0, len(self), batch_size):
+            yield self.replay(np.arange(start, min(start + batch_size, len(self))), extractor)
+
+    def featurize_all(self, extractor=VecGame.features, batch_size=4096):
+        batches = list(self.featurize(extractor, batch_size))
+        if not batches:
+            return np.empty((0, 0), dtype=np.float32), np.empty(0, dtype=np.int64)
+        return np.concatenate([b[0] for b in batches]), np.concatenate([b[1] for b in batches])
+
+    def replay(self, idx, extractor=VecGame.features):
+        """Play games `idx` again in lockstep and featurize the kept decisions."""
+        vg = VecGame(self.initial_states(idx))
+        lengths = self.index["n_actions"][idx]
+        moves = np.zeros((len(idx), lengths.max(initial=0)), dtype=np.int64)
+        for k, i in enumerate(idx):
+            moves[k, :lengths[k]] = self.game_actions(i)
+        keep = self.index["keep"][idx].astype(np.int64)
+        first = self.index["first"][idx].astype(np.int64)
+
+        feats, ys, games, ranks, steps = [], [], [], [], []
+        for t in range(moves.shape[1]):
+            active = np.flatnonzero(lengths > t)
+            mover = vg.turn[active]
+            sel = active[((keep[active] >> mover) & 1).astype(bool)]
+            if sel.size:
+                feats.append(np.asarray(extractor(vg.subset(sel))))
+                ys.append(moves[sel, t])
+                games.append(sel)
+                ranks.append(vg.turn[sel] != first[sel])
+                steps.append(np.full(sel.size, t))
+            vg.step(active, moves[active, t])
+
+        if not feats:
+            return np.empty((0, 0), dtype=np.float32), np.empty(0, dtype=np.int64)
+        order = np.lexsort((np.concatenate(steps), np.concatenate(ranks), np.concatenate(games)))
+        return np.concatenate(feats)[order], np.concatenate(ys)[order]
@@ -0,0 +1,236 @@
+"""
+Expectimax solver over the mover's information state.
+
+A state is seen from the player to move and encoded as the tuple
+
+    (left, Left_real, Left_fake, hp_me, hp_opp, *items_me, *items_opp,
+     double_mark, skip_round_mark, known, next)
+
+with items ordered as ITEMS, and `known` / `next` 0 / 1 / 2 when the current / next round
+is unknown / live / blank to the mover. Values are the expected final hp difference
+(mover minus opponent) with both sides playing optimally; chance nodes weight live and
+blank by the mover's posterior from the public counts and its own reveals.
+
+The abstraction keeps what the mover knows about the next two rounds, with two
+simplifications: private knowledge is dropped when the turn passes (the opponent decides
+without it and the mover forgets it), and random reveals of rounds further ahead are
+treated as giving no information. Tracking those multiplies the table several times
+over for little gain, since the turn usually passes before they come up.
+"""
+import os
+import sys
+import numpy as np
+import game
+
+ITEMS = ("heal_left", "reveal_left", "random_reveal_left", "skip_bullet_left", "skip_round_left", "double_left")
+HEAL, REVEAL, RANDOM_REVEAL, SKIP_BULLET, SKIP_ROUND, DOUBLE = range(6)
+N_ITEMS = len(ITEMS)
+LEFT, REAL, FAKE, HP_ME, HP_OPP = range(5)
+ME = 5
+OPP = ME + N_ITEMS
+DMARK = OPP + N_ITEMS
+SMARK, KNOWN, NEXT = DMARK + 1, DMARK + 2, DMARK + 3
+
+
+def encode_state(state):
+    # GameState -> solver key from the point of view of the player to move
+    turn, pos = state.turn, state.pos
+    own = state.revealed[turn]
+    known = 0
+    if (own >> pos) & 1:
+        known = 1 if (state.live >> pos) & 1 else 2
+    nxt = 0
+    if pos + 1 < state.n_rounds and (own >> (pos + 1)) & 1:
+        nxt = 1 if (state.live >> (pos + 1)) & 1 else 2
+    return ((state.n_rounds - pos, state.Left_real, state.Left_fake, state.hp[turn], state.hp[turn ^ 1])
+            + tuple(getattr(state, name)[turn] for name in ITEMS)
+            + tuple(getattr(state, name)[turn ^ 1] for name in ITEMS)
+            + (state.double_mark, state.skip_round_mark, known, nxt))
+
+
+class Solver:
+    def __init__(self, damage_per_shot=34, max_hp=100):
+        self.damage = damage_per_shot
+        self.max_hp = max_hp
+        self.table = {}   # key -> (value, best action)
+
+    def solve(self, key):
+        hit = self.table.get(key)
+        if hit is not None:
+            return hit
+        if key[HP_ME] <= 0 or key[HP_OPP] <= 0 or key[LEFT] == 0:
+            hit = (key[HP_ME] - key[HP_OPP], -1)
+        else:
+            best_v, best_a = None, -1
+            for a in self.actions(key):
+                v = self.q_value(key, a)
+                if best_v is None or v > best_v:
+                    best_v, best_a = v, a
+            hit = (best_v, best_a)
+        self.table[key] = hit
+        return hit
+
+    def value(self, key):
+        return self.solve(key)[0]
+
+    def actions(self, key):
+        acts = [0, 1]
+        if key[ME + HEAL] > 0 and key[HP_ME] < self.max_hp:
+            acts.append(2)
+        if key[ME + REVEAL] > 0 and key[KNOWN] == 0:
+            acts.append(3)
+        if key[ME + DOUBLE] > 0 and key[DMARK] == 0:
+            acts.append(4)
+        if key[ME + SKIP_ROUND] > 0 and key[SMARK] == 0:
+            acts.append(5)
+        if key[ME + SKIP_BULLET] > 0:
+            acts.append(6)
+        if key[ME + RANDOM_REVEAL] > 0:
+            acts.append(7)
+        return acts
+
+    def p_live(self, key, exclude_current=False):
+        # Posterior that an unseen round is live; rounds the mover has seen are taken out of the pool
+        real, total = key[REAL], key[REAL] + key[FAKE]
+        if exclude_current and key[KNOWN]:
+            real -= key[KNOWN] == 1
+            total -= 1
+        if key[NEXT]:
+            real -= key[NEXT] == 1
+            total -= 1
+        if total <= 0:
+            return 0.0
+        return min(max(real / total, 0.0), 1.0)
+
+    def q_value(self, key, a):
+        k = list(key)
+        if a == 2:
+            k[HP_ME] = min(k[HP_ME] + self.damage, self.max_hp)
+            k[ME + HEAL] -= 1
+            return self.value(tuple(k))
+        if a == 4:
+            k[ME + DOUBLE] -= 1
+            k[DMARK] = 1
+            return self.value(tuple(k))
+        if a == 5:
+            k[ME + SKIP_ROUND] -= 1
+            k[SMARK] = 1
+            return self.value(tuple(k))
+        if a == 6:
+            k[ME + SKIP_BULLET] -= 1
+            self._advance(k)
+            return self.value(tuple(k))
+        if a == 3:
+            k[ME + REVEAL] -= 1
+            return self._chance_current(k, self._seen_current)
+        if a == 7:
+            k[ME + RANDOM_REVEAL] -= 1
+            return self._random_reveal(k)
+        return self._chance_current(k, lambda kk, live: self._after_shot(kk, a, live))
+
+    def _seen_current(self, k, live):
+        k[KNOWN] = 1 if live else 2
+        return self.value(tuple(k))
+
+    def _chance_current(self, k, fn):
+        if k[KNOWN]:
+            return fn(list(k), k[KNOWN] == 1)
+        p = self.p_live(k)
+        v = 0.0
+        if p > 0:
+            v += p * fn(list(k), True)
+        if p < 1:
+            v += (1 - p) * fn(list(k), False)
+        return v
+
+    def _random_reveal(self, k):
+        if k[LEFT] == 1:
+            return self._chance_current(k, self._seen_current)
+        # Uniform over the later rounds; only the next one is tracked, the others add nothing
+        v = (k[LEFT] - 2) * self.value(tuple(k))
+        if k[NEXT]:
+            v += self.value(tuple(k))
+        else:
+            p = self.p_live(k, exclude_current=True)
+            for live, w in ((1, p), (0, 1 - p)):
+                if w > 0:
+                    kk = list(k)
+                    kk[NEXT] = 1 if live else 2
+                    v += w * self.value(tuple(kk))
+        return v / (k[LEFT] - 1)
+
+    def _advance(self, k):
+        # Move to the next round, carrying the mover's knowledge along
+        k[LEFT] -= 1
+        k[KNOWN], k[NEXT] = k[NEXT], 0
+
+    def _after_shot(self, k, goal, live):
+        passes = False
+        if live:
+            k[HP_OPP if goal == 1 else HP_ME] -= self.damage * (k[DMARK] + 1)
+            passes = k[SMARK] == 0
+            k[SMARK] = 0
+            k[REAL] -= 1
+        else:
+            if goal == 1:
+                passes = k[SMARK] == 0
+                k[SMARK] = 0
+            k[FAKE] -= 1
+        k[DMARK] = 0
+        self._advance(k)
+        if not passes:
+            return self.value(tuple(k))
+        return -self.value(self._swap(k))
+
+    @staticmethod
+    def _swap(k):
+        # Same position seen by the opponent, who has none of our private knowledge
+        return tuple(k[:HP_ME] + [k[HP_OPP], k[HP_ME]] + k[OPP:DMARK] + k[ME:OPP] + [k[DMARK], k[SMARK], 0, 0])
+
+    def save(self, path):
+        # Keys as an int16 matrix rather than pickled tuples: much smaller and faster to reload
+        keys = np.array(list(self.table), dtype=np.int16)
+        values, actions = zip(*self.table.values())
+        np.savez(path, keys=keys, values=np.array(values, dtype=np.float64),
+                 actions=np.array(actions, dtype=np.int8), env=np.array([self.damage, self.max_hp]))
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        solver = cls(*data["env"].tolist())
+        solver.table = dict(zip(map(tuple, data["keys"].tolist()),
+                                zip(data["values"].tolist(), data["actions"].tolist())))
+        return solver
+
+
+def solve_env(env_kwargs, solver=None):
+    # Fill the table from the opening position of an environment (same for either starting player)
+    st = game.init_game(seed=0, **env_kwargs)
+    solver = solver or Solver(st.damage_per_shot, st.max_hp)
+    solver.solve(encode_state(st))
+    return solver
+
+
+class OptimalPlayer(game.Player):
+    """Plays the solver's best action; states missing from the table are solved on first visit."""
+    def __init__(self, solver):
+        self.solver = solver
+
+    def decide(self, state):
+        # Table keys leave out damage and max hp: a table solved for another env gives wrong moves
+        if state.damage_per_shot != self.solver.damage or state.max_hp != self.solver.max_hp:
+            raise ValueError(f"Solver is for damage {self.solver.damage} / max hp {self.solver.max_hp}, "
+                             f"game has {state.damage_per_shot} / {state.max_hp}")
+        return self.solver.solve(encode_state(state))[1]
+
+
+if __name__ == "__main__":
+    # python solver.py [out_path]: solve the canonical environment and save the table
+    from train_models import CANONICAL_ENV
+    sys.setrecursionlimit(10000)
+    out = sys.argv[1] if len(sys.argv) > 1 else os.path.join("models", "solver_canonical.npz")
+    solver = solve_env(CANONICAL_ENV)
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    solver.save(out)
+    print(f"Solved {len(solver.table)} states, root value {solver.value(encode_state(game.init_game(**CANONICAL_ENV))):.3f}")
+    print(f"Saved table to: {out}")
@@ -0,0 +1,62 @@
+"""
+game.do_action / game.undo round trips: from every position of seeded games with
+randomized item counts, each action (legal, illegal, unknown, or an item with none
+left) followed by undo gives back the exact packed state.
+
+    python -m pytest -q test_undo.py
+"""
+import random
+import pytest
+import game
+
+N_GAMES = 300
+ACTIONS = list(range(8)) + [8, -1]
+
+
+def random_game(seed):
+    rng = random.Random(seed)
+    return game.init_game(seed=seed, real=rng.randint(1, 10), fake=rng.randint(1, 10), heal=rng.randint(0, 2),
+                          reveal=rng.randint(0, 2), damage_per_shot=int(100 / rng.randint(2, 10)) + 1,
+                          skip_round=rng.randint(0, 2), skip_bullet=rng.randint(0, 2),
+                          double=rng.randint(0, 2), reveal_random=rng.randint(0, 2),
+                          begin=rng.randint(0, 1), reveal_seed=game.reveal_seed_for(seed))
+
+
+def positions(seed):
+    # Every decision point of a game played with random actions 0-7
+    st = random_game(seed)
+    rng = random.Random(f"{seed}/moves")
+    while game.check_finish(st) is None:
+        yield st
+        game.apply_action(st, rng.randint(0, 7))
+
+
+def assert_round_trip(st, action):
+    before = st.pack()
+    record = game.do_action(st, action)
+    game.undo(st, record)
+    assert st.pack() == before, f"action {action}"
+
+
+@pytest.mark.parametrize("seed", range(0, N_GAMES, 50))
+def test_every_action_round_trips(seed):
+    for s in range(seed, seed + 50):
+        for st in positions(s):
+            for action in ACTIONS:
+                assert_round_trip(st, action)
+
+
+@pytest.mark.parametrize("seed", range(0, N_GAMES, 50))
+def test_item_without_items_round_trips(seed):
+    # With the mover's counter at zero an item action takes the illegal-move penalty
+    for s in range(seed, seed + 50):
+        for st in positions(s):
+            for action, counter in game.ITEM_COUNTERS.items():
+                empty = st.clone()
+                t = empty.turn
+                getattr(empty, counter)[t] = 0
+                before = empty.pack()
+                record = game.do_action(empty, action)
+                assert empty.illegal_move[t] == st.illegal_move[t] + 1
+                game.undo(empty, record)
+                assert empty.pack() == before, f"action {action}"
@@ -0,0 +1,182 @@
+"""
+Incremental round-robin tournament.
+
+Players are described by JSON specs ({"type": "tbaseline", "t_shoot": 0.5, ...}) in a
+registry name -> spec. Every pair of players plays one matchup under the canonical env
+and its result is stored in a JSON file keyed by the two config hashes, the env and the
+seed range. A config hash covers the spec and, for saved models, the model files, so a
+retrained model counts as a new player. A run only plays the pairings missing from the
+store; adding one player costs one matchup per existing player.
+
+    python tournament.py [--games N] [--workers K] [--store PATH]
+"""
+import os
+import sys
+import json
+import glob
+import hashlib
+import argparse
+import itertools
+import numpy as np
+from baseline_player import BaselinePlayer, TBaselinePlayer, RandomPlayer, RolloutPlayer
+from train_models import CANONICAL_ENV, EVAL_SEED0, EVAL_WORKERS, MODEL_DIR, ModelPlayer, play_many_games
+
+STORE_PATH = os.path.join("tournament", "results.json")
+TOURNAMENT_GAMES = 2000
+
+
+def default_registry(model_dir=MODEL_DIR):
+    registry = {
+        "Baseline": {"type": "baseline"},
+        "TBaseline(0.5,0.2,0.3)": {"type": "tbaseline", "t_shoot": 0.5, "t_reveal": 0.2, "t_use": 0.3},
+        "TBaseline(0.7,0.2,0.5)": {"type": "tbaseline", "t_shoot": 0.7, "t_reveal": 0.2, "t_use": 0.5},
+        "TBaseline(0.6,0.25,0.4)": {"type": "tbaseline", "t_shoot": 0.6, "t_reveal": 0.25, "t_use": 0.4},
+        "Random": {"type": "random", "seed": 81925},
+        "Rollout(n=5)": {"type": "rollout", "n_rollouts": 5},
+        "Rollout(n=10)": {"type": "rollout", "n_rollouts": 10},
+    }
+    for path in sorted(glob.glob(os.path.join(model_dir, "policy_*.joblib"))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        registry[f"Model({name})"] = {"type": "model", "path": path}
+    return registry
+
+
+def build_player(spec):
+    kwargs = {k: v for k, v in spec.items() if k != "type"}
+    kind = spec["type"]
+    if kind == "baseline":
+        return BaselinePlayer()
+    if kind == "tbaseline":
+        return TBaselinePlayer(**kwargs)
+    if kind == "random":
+        return RandomPlayer(**kwargs)
+    if kind == "rollout":
+        return RolloutPlayer(**kwargs)
+    if kind == "model":
+        import joblib
+        return ModelPlayer(joblib.load(kwargs["path"]))
+    if kind == "compiled":
+        from compiled_policy import CompiledPolicyPlayer
+        return CompiledPolicyPlayer(kwargs["path"])
+    if kind == "ismcts":
+        from ismcts import ISMCTSPlayer
+        return ISMCTSPlayer(**kwargs)
+    raise ValueError(f"Unknown player type: {kind}")
+
+
+def _digest(obj):
+    return hashlib.sha1(json.dumps(obj, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def config_hash(spec):
+    # Spec plus the content of any model file / directory it points at
+    h = hashlib.sha1(json.dumps(spec, sort_keys=True).encode())
+    path = spec.get("path")
+    if path is not None:
+        files = sorted(glob.glob(os.path.join(path, "*"))) if os.path.isdir(path) else [path]
+        for f in files:
+            with open(f, "rb") as fh:
+                h.update(hashlib.sha1(fh.read()).digest())
+    return h.hexdigest()[:16]
+
+
+def matchup_key(hash_a, hash_b, env, seed0, n_games):
+    return f"{hash_a}:{hash_b}:{_digest(env)}:{seed0}+{n_games}"
+
+
+def load_store(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def save_store(path, store):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "w") as fh:
+        json.dump(store, fh, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+def run_tournament(registry, n_games=TOURNAMENT_GAMES, seed0=EVAL_SEED0, env=CANONICAL_ENV,
+                   store_path=STORE_PATH, n_workers=EVAL_WORKERS):
+    """
+    Play every missing pairing and return {(name_a, name_b): result} for all pairings.
+
+    Pairings are taken in registry order with the earlier player as player 0; the
+    starting player is drawn per game, so one direction is enough. Each result is saved
+    as soon as it is played.
+    """
+    store = load_store(store_path)
+    hashes = {name: config_hash(spec) for name, spec in registry.items()}
+    results = {}
+    for a, b in itertools.combinations(registry, 2):
+        key = matchup_key(hashes[a], hashes[b], env, seed0, n_games)
+        if key not in store:
+            p0, p1 = build_player(registry[a]), build_player(registry[b])
+            # play_many_games only batches pairs whose results match the serial protocol
+            metrics = play_many_games(p0, p1, n_games, seed0, env, vectorized=True, n_workers=n_workers)
+            wins, draws = metrics["wins_p0"], metrics["draws"]
+            store[key] = {"p0": registry[a], "p1": registry[b], "wins_p0": wins, "draws": draws,
+                          "wins_p1": n_games - wins - draws, "metrics": metrics}
+            save_store(store_path, store)
+        results[a, b] = store[key]
+    return results
+
+
+def bradley_terry(names, results, iters=1000, tol=1e-10):
+    """
+    Bradley-Terry strengths by the MM algorithm (draws count half a win to each side),
+    reported on the Elo scale with mean 1500.
+    """
+    idx = {n: i for i, n in enumerate(names)}
+    k = len(names)
+    wins = np.zeros((k, k))
+    for (a, b), r in results.items():
+        wins[idx[a], idx[b]] += r["wins_p0"] + r["draws"] / 2
+        wins[idx[b], idx[a]] += r["wins_p1"] + r["draws"] / 2
+    # A small prior game against an average player keeps unbeaten / winless players finite
+    games = wins + wins.T
+    total_wins = wins.sum(axis=1) + 0.5
+    p = np.ones(k)
+    for _ in range(iters):
+        denom = (games / (p[:, None] + p[None, :])).sum(axis=1) + 1 / (p + 1)
+        new = total_wins / denom
+        new /= np.exp(np.log(new).mean())
+        if np.max(np.abs(new - p)) < tol:
+            p = new
+            break
+        p = new
+    elo = 400 * np.log10(p)
+    return dict(zip(names, 1500 + elo - elo.mean()))
+
+
+def ratings_table(names, results):
+    ratings = bradley_terry(names, results)
+    score = {n: 0.0 for n in names}
+    played = {n: 0 for n in names}
+    for (a, b), r in results.items():
+        n = r["wins_p0"] + r["draws"] + r["wins_p1"]
+        score[a] += r["wins_p0"] + r["draws"] / 2
+        score[b] += r["wins_p1"] + r["draws"] / 2
+        played[a] += n
+        played[b] += n
+    lines = [f"{'Player':<32}{'Rating':>8}{'Score':>9}{'Games':>8}"]
+    for name in sorted(names, key=lambda n: -ratings[n]):
+        lines.append(f"{name:<32}{ratings[name]:>8.0f}{score[name] / max(played[name], 1):>9.3f}{played[name]:>8}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Round-robin tournament with a persistent results store")
+    parser.add_argument("--games", type=int, default=TOURNAMENT_GAMES)
+    parser.add_argument("--workers", type=int, default=EVAL_WORKERS)
+    parser.add_argument("--store", default=STORE_PATH)
+    args = parser.parse_args()
+
+    registry = default_registry()
+    before = len(load_store(args.store))
+    results = run_tournament(registry, n_games=args.games, store_path=args.store, n_workers=args.workers)
+    played = len(load_store(args.store)) - before
+    print(f"{len(results)} pairings, {played} played now, {len(results) - played} from {args.store}", file=sys.stderr)
+    print(ratings_table(list(registry), results))
@@ -1,25 +1,50 @@
 import os
+import json
+import time
 import random
+import tempfile
+import multiprocessing as mp
 from tqdm.auto import tqdm
 import joblib
 import numpy as np
 import game
+from vec_game import VecGame
+from compiled_policy import export_policy
+from instrumentation import Collector
 from baseline_player import BaselinePlayer, TBaselinePlayer, RandomPlayer, RolloutPlayer
 from sklearn.model_selection import train_test_split
-from sklearn.metrics import classification_report, confusion_matrix
-from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import classification_report, confusion_matrix, accuracy_score, f1_score
+from threadpoolctl import threadpool_limits
+from sklearn.linear_model import LogisticRegression, SGDClassifier
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.neural_network import MLPClassifier
 from sklearn.preprocessing import StandardScaler
 from sklearn.pipeline import Pipeline
 
-MODEL = "lr"   # "lr" | "rf" | "mlp"
-DATA_PATH = "data/dataset_v1.npz"
+MODEL = "lr"   # "lr" | "rf" | "mlp" | "sgd"
+DATA_PATH = "data/dataset_v1.npz"   # or data/dataset_v1_compact.npz (unique rows + action counts)
+DATA_DIR = "data/dataset_v1"   # shard directory written by data_extraction.collect_sharded
+STREAMING = False              # train out-of-core from DATA_DIR (incremental models only)
+STREAM_EPOCHS = 5
+STREAM_BATCH = 4096
 MODEL_DIR = "models"
 RANDOM_SEED = 81925
 
 EVAL_GAMES = 10000
 EVAL_SEED0 = 92122
+EVAL_WORKERS = os.cpu_count() or 1
+EVAL_PRECISION = None   # e.g. 0.01: stop a matchup once the win / draw rate intervals are that narrow
+
+SWEEP = False   # train and compare SWEEP_GRID instead of a single MODEL
+SWEEP_GRID = [
+    ("lr", {}),
+    ("sgd", {}),
+    ("rf", {"n_estimators": 50, "max_depth": 10}),
+    ("rf", {}),
+    ("mlp", {"hidden_layer_sizes": (32, 32)}),
+    ("mlp", {}),
+]
+SWEEP_WORKERS = min(len(SWEEP_GRID), os.cpu_count() or 1)
 
 # Canonical (fixed) environment config for evaluation
 CANONICAL_ENV = dict(real=5, fake=5, heal=1, reveal=1, damage_per_shot=34,
@@ -35,8 +60,26 @@ class ModelPlayer(game.Player):
         a = self.clf.predict(x)[0]
         return int(a)
 
+    def decide_batch(self, states):
+        # One predict call for every game in the batch that is waiting on this model
+        return self.clf.predict(states.features()).astype(np.int64)
+
+
+def build_model(model_name: str, **overrides):
+    """
+    Estimator for `model_name`; `overrides` are set on the final estimator (e.g.
+    build_model("rf", n_estimators=50) or build_model("mlp", hidden_layer_sizes=(32, 32))).
+    """
+    clf = _base_model(model_name)
+    if overrides:
+        if isinstance(clf, Pipeline):
+            last = clf.steps[-1][0]
+            overrides = {f"{last}__{k}": v for k, v in overrides.items()}
+        clf.set_params(**overrides)
+    return clf
+
 
-def build_model(model_name: str):
+def _base_model(model_name: str):
     if model_name == "lr":
         return LogisticRegression(
             max_iter=2000,
@@ -60,13 +103,26 @@ def build_model(model_name: str):
                 random_state=RANDOM_SEED,
             ))
         ])
+    if model_name == "sgd":
+        return SGDClassifier(
+            loss="log_loss",
+            alpha=1e-5,
+            random_state=RANDOM_SEED,
+        )
     raise ValueError(f"Unknown MODEL: {model_name}")
 
 
+# Families whose build_model() result can be trained batch by batch
+INCREMENTAL_MODELS = ("sgd", "mlp")
+ACTIONS = np.arange(8)
+
+
 def train_from_npz(data_path: str, model_name: str):
     data = np.load(data_path)
-    X = data["X"].astype(np.float32)
-    y = data["y"].astype(np.int64)
+    if "counts" in data.files:
+        return train_from_compact(data["X"].astype(np.float32, copy=False), data["counts"], model_name)
+    X = data["X"].astype(np.float32, copy=False)
+    y = data["y"].astype(np.int64, copy=False)
 
     X_train, X_test, y_train, y_test = train_test_split(
         X, y,
@@ -88,57 +144,449 @@ def train_from_npz(data_path: str, model_name: str):
 
     return clf
 
-def play_many_games(player0, player1, n_games: int, seed0: int, env_kwargs: dict):
+
+def weighted_split(counts, test_size: float = 0.2, seed: int = RANDOM_SEED):
+    """
+    Stratified train / test split of per-row action counts: test_size of every action's
+    samples (rounded up, as train_test_split does) go to the test side, drawn without
+    replacement, so it is the split of the expanded dataset without expanding it.
+    """
+    rng = np.random.default_rng(seed)
+    test = np.zeros_like(counts)
+    for a in range(counts.shape[1]):
+        n_test = int(np.ceil(test_size * counts[:, a].sum()))
+        if n_test:
+            test[:, a] = rng.multivariate_hypergeometric(counts[:, a], n_test)
+    return counts - test, test
+
+
+def weighted_samples(X_unique, counts):
+    # One sample per (row, action) seen, weighted by how often it was seen
+    rows, actions = np.nonzero(counts)
+    return X_unique[rows], actions.astype(np.int64), counts[rows, actions].astype(np.float64)
+
+
+def fit_weighted(clf, X, y, w):
+    if isinstance(clf, Pipeline):
+        # Every step that takes weights (StandardScaler included) sees them
+        return clf.fit(X, y, **{f"{name}__sample_weight": w for name, _ in clf.steps})
+    return clf.fit(X, y, sample_weight=w)
+
+
+def train_from_compact(X_unique, counts, model_name: str):
+    train, test = weighted_split(counts)
+    X_train, y_train, w_train = weighted_samples(X_unique, train)
+    X_test, y_test, w_test = weighted_samples(X_unique, test)
+    print(f"Compact data: {len(X_train)} weighted train samples for {int(w_train.sum())} rows")
+
+    clf = fit_weighted(build_model(model_name), X_train, y_train, w_train)
+
+    y_pred = clf.predict(X_test)
+
+    print("\n=== Classification report ===")
+    print(classification_report(y_test, y_pred, sample_weight=w_test, digits=4))
+
+    print("=== Confusion matrix (rows=true, cols=pred) ===")
+    print(confusion_matrix(y_test, y_pred, labels=[0, 1, 2, 3, 4, 5, 6, 7], sample_weight=w_test).astype(np.int64))
+
+    return clf
+
+def open_shards(data_dir: str):
+    """Memory-map every shard listed in data_dir/manifest.json as (X, y) pairs."""
+    with open(os.path.join(data_dir, "manifest.json")) as fh:
+        manifest = json.load(fh)
+    return [(np.load(os.path.join(data_dir, s["X"]), mmap_mode="r"),
+             np.load(os.path.join(data_dir, s["y"]), mmap_mode="r"))
+            for s in manifest["shards"]]
+
+
+def iter_minibatches(shards, batch_size: int, rng=None):
+    # Slices of the memmaps are views; only the batch itself is paged in
+    order = list(range(len(shards)))
+    if rng is not None:
+        rng.shuffle(order)
+    for k in order:
+        X, y = shards[k]
+        starts = list(range(0, len(y), batch_size))
+        if rng is not None:
+            rng.shuffle(starts)
+        for s in starts:
+            yield X[s:s + batch_size], y[s:s + batch_size]
+
+
+def train_streaming(data_dir: str, model_name: str, epochs: int = STREAM_EPOCHS, batch_size: int = STREAM_BATCH,
+                    test_shards: int = 1):
+    """
+    Out-of-core counterpart of train_from_npz for INCREMENTAL_MODELS.
+
+    The last `test_shards` shards are held out; the rest are streamed through
+    partial_fit for `epochs` passes. The report is built from a confusion matrix
+    accumulated batch by batch over the held-out shards.
+    """
+    if model_name not in INCREMENTAL_MODELS:
+        raise ValueError(f"MODEL {model_name} does not support incremental fitting")
+    shards = open_shards(data_dir)
+    if len(shards) <= test_shards:
+        raise ValueError(f"Need more than {test_shards} shards to hold out a test set")
+    train, test = shards[:-test_shards], shards[-test_shards:]
+    rng = random.Random(RANDOM_SEED)
+
+    clf = build_model(model_name)
+    if model_name == "mlp":
+        scaler, mlp = clf.named_steps["scaler"], clf.named_steps["mlp"]
+        mlp.set_params(early_stopping=False)
+        for Xb, _ in iter_minibatches(train, batch_size):
+            scaler.partial_fit(Xb)
+        est, prep = mlp, scaler.transform
+    else:
+        est, prep = clf, None
+
+    for epoch in tqdm(range(epochs), desc=f"Streaming {model_name}", ncols=100):
+        for Xb, yb in iter_minibatches(train, batch_size, rng):
+            if prep is not None:
+                Xb = prep(Xb)
+            est.partial_fit(Xb, yb, classes=ACTIONS)
+
+    cm = np.zeros((len(ACTIONS), len(ACTIONS)), dtype=np.int64)
+    for Xb, yb in iter_minibatches(test, batch_size):
+        cm += confusion_matrix(yb, clf.predict(Xb), labels=ACTIONS)
+
+    print("\n=== Classification report ===")
+    print(report_from_confusion(cm))
+
+    print("=== Confusion matrix (rows=true, cols=pred) ===")
+    print(cm)
+
+    return clf
+
+
+def report_from_confusion(cm, digits: int = 4):
+    # Per-class precision / recall / F1 in the layout of sklearn's classification_report
+    tp = np.diag(cm).astype(np.float64)
+    support = cm.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.nan_to_num(tp / cm.sum(axis=0))
+        recall = np.nan_to_num(tp / support)
+        f1 = np.nan_to_num(2 * precision * recall / (precision + recall))
+    total = support.sum()
+    lines = [f"{'':>12}{'precision':>10}{'recall':>10}{'f1-score':>10}{'support':>10}", ""]
+    for k in range(len(cm)):
+        lines.append(f"{k:>12}{precision[k]:>10.{digits}f}{recall[k]:>10.{digits}f}{f1[k]:>10.{digits}f}{support[k]:>10}")
+    lines.append("")
+    lines.append(f"{'accuracy':>12}{'':>10}{'':>10}{tp.sum() / total:>10.{digits}f}{total:>10}")
+    for name, w in (("macro avg", np.ones_like(tp) / len(tp)), ("weighted avg", support / total)):
+        lines.append(f"{name:>12}{(precision * w).sum():>10.{digits}f}{(recall * w).sum():>10.{digits}f}"
+                     f"{(f1 * w).sum():>10.{digits}f}{total:>10}")
+    return "\n".join(lines)
+
+
+def sweep(data_path: str, grid, n_workers: int = SWEEP_WORKERS, cpus_per_worker: int = None,
+          out_path: str = os.path.join(MODEL_DIR, "sweep.md")):
+    """
+    Train every (model_name, overrides) of `grid` on the same split, in parallel.
+
+    The dataset is loaded and split once; the splits are written as .npy files that every
+    worker memory-maps read-only, so workers share the page cache instead of each holding
+    a copy. Each worker is limited to `cpus_per_worker` threads (BLAS / OpenMP through
+    threadpoolctl, and n_jobs for estimators that have it), by default an equal share of
+    the machine. Writes a markdown table to out_path and the raw rows next to it as JSON.
+    """
+    data = np.load(data_path)
+    if "counts" in data.files:
+        train, test = weighted_split(data["counts"])
+        X = data["X"].astype(np.float32, copy=False)
+        split = dict(zip(("X_train", "y_train", "w_train"), weighted_samples(X, train)))
+        split.update(zip(("X_test", "y_test", "w_test"), weighted_samples(X, test)))
+    else:
+        X = data["X"].astype(np.float32, copy=False)
+        y = data["y"].astype(np.int64, copy=False)
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=RANDOM_SEED, stratify=y)
+        split = {"X_train": X_train, "y_train": y_train, "X_test": X_test, "y_test": y_test}
+    del data
+
+    n_workers = max(1, min(n_workers, len(grid)))
+    cpus = cpus_per_worker or max(1, (os.cpu_count() or 1) // n_workers)
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = {}
+        for name, arr in split.items():
+            paths[name] = os.path.join(tmp, f"{name}.npy")
+            np.save(paths[name], arr)
+        del split
+        jobs = list(enumerate(grid))
+        with mp.Pool(n_workers, initializer=_init_sweep_worker, initargs=(paths, cpus)) as pool:
+            rows = sorted(tqdm(pool.imap_unordered(_sweep_worker, jobs), total=len(jobs), desc="Sweep"),
+                          key=lambda r: r["index"])
+
+    table = sweep_table(rows)
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    with open(out_path, "w") as fh:
+        fh.write(table + "\n")
+    with open(os.path.splitext(out_path)[0] + ".json", "w") as fh:
+        json.dump(rows, fh, indent=1)
+    return rows
+
+
+_SWEEP_WORKER = {}
+
+
+def _init_sweep_worker(paths, cpus):
+    _SWEEP_WORKER["data"] = {name: np.load(path, mmap_mode="r") for name, path in paths.items()}
+    _SWEEP_WORKER["cpus"] = cpus
+    # Stays in effect for the life of the worker
+    _SWEEP_WORKER["limits"] = threadpool_limits(limits=cpus)
+
+
+def _sweep_worker(job):
+    index, (model_name, overrides) = job
+    d = _SWEEP_WORKER["data"]
+    clf = build_model(model_name, **overrides)
+    # Estimators that spawn their own jobs (RandomForest n_jobs=-1) get the worker's budget
+    n_jobs = {k: _SWEEP_WORKER["cpus"] for k in clf.get_params() if k == "n_jobs" or k.endswith("__n_jobs")}
+    clf.set_params(**n_jobs)
+
+    t = time.perf_counter()
+    if "w_train" in d:
+        fit_weighted(clf, d["X_train"], d["y_train"], d["w_train"])
+    else:
+        clf.fit(d["X_train"], d["y_train"])
+    fit_s = time.perf_counter() - t
+
+    t = time.perf_counter()
+    y_pred = clf.predict(d["X_test"])
+    predict_s = time.perf_counter() - t
+
+    w = d.get("w_test")
+    return {
+        "index": index,
+        "model": model_name,
+        "params": {k: list(v) if isinstance(v, tuple) else v for k, v in overrides.items()},
+        "fit_s": fit_s,
+        "predict_rows_per_s": len(y_pred) / predict_s,
+        "accuracy": float(accuracy_score(d["y_test"], y_pred, sample_weight=w)),
+        "f1": f1_score(d["y_test"], y_pred, labels=ACTIONS, average=None, sample_weight=w, zero_division=0).tolist(),
+    }
+
+
+def sweep_table(rows):
+    header = "| Model | Params | Fit (s) | Predict (rows/s) | Accuracy | " + " | ".join(f"F1 {a}" for a in ACTIONS) + " |"
+    lines = [header, "|" + "---|" * (5 + len(ACTIONS))]
+    for r in rows:
+        params = ", ".join(f"{k}={v}" for k, v in r["params"].items()) or "default"
+        lines.append(f"| {r['model']} | {params} | {r['fit_s']:.2f} | {r['predict_rows_per_s']:,.0f} | "
+                     f"{r['accuracy']:.4f} | " + " | ".join(f"{f:.3f}" for f in r["f1"]) + " |")
+    return "\n".join(lines)
+
+
+def play_many_games(player0, player1, n_games: int, seed0: int, env_kwargs: dict, vectorized: bool = False,
+                    n_workers: int = 1, collector: Collector = None, precision: float = None,
+                    score_precision: float = None, batch_size: int = 500, z: float = 1.96):
+    """
+    Play games with seeds seed0 .. seed0 + n_games - 1.
+
+    Each game has its own random-reveal stream and players are reseeded per game through
+    Player.new_game, so the metrics are identical for any n_workers.
+
+    With vectorized=True each shard is played in lockstep by VecGame: every step gathers
+    all games waiting on the same player into one decide_batch call (a single predict for
+    ModelPlayer). VecGame never calls new_game, so players with their own RNG (RandomPlayer,
+    RolloutPlayer, ISMCTSPlayer: any that override new_game) would draw in batch order and
+    give results that depend on the sharding; for those the serial path is used instead,
+    and the results always match vectorized=False.
+
+    The metrics hold the integer win / draw counts next to the rates.
+
+    A `collector` (instrumentation.Collector) receives the timings and counters of every
+    game; workers fill their own and are merged into it. Not available with vectorized=True.
+
+    Sequential mode (`precision` and / or `score_precision` set): games are played in
+    seed order, `batch_size` at a time, and the run stops early once the z-level intervals
+    of the win and draw rates (Wilson) have half-width <= precision and the interval of
+    the average score has half-width <= score_precision (hp). The games played are always
+    a prefix seed0 .. seed0 + k - 1 of the fixed protocol; the metrics add the intervals
+    and the number of games used.
+    """
+    if vectorized and collector is not None:
+        raise ValueError("Instrumentation needs the run_game path (vectorized=False)")
+    play = _play_range_vec if vectorized and _batchable(player0) and _batchable(player1) else _play_range
+    desc = f"Eval {player0.__class__.__name__} vs {player1.__class__.__name__}"
+    sequential = precision is not None or score_precision is not None
+    step = batch_size if sequential else n_games
+
+    pool = None
+    if n_workers > 1:
+        trace = collector.trace if collector is not None else None
+        origin = collector.origin if collector is not None else None
+        pool = mp.Pool(n_workers, initializer=_init_eval_worker,
+                       initargs=(player0, player1, env_kwargs, play, trace, origin))
+    counts = [0] * 6
+    played = 0
+    try:
+        with tqdm(total=n_games, desc=desc, ncols=100) as bar:
+            while played < n_games:
+                seeds = range(seed0 + played, seed0 + min(played + step, n_games))
+                if pool is None:
+                    part = play(player0, player1, seeds, env_kwargs, progress=bar, collector=collector)
+                else:
+                    part = _play_on_pool(pool, seeds, n_workers, collector, bar)
+                counts = [c + p for c, p in zip(counts, part)]
+                played += len(seeds)
+                if sequential and _precise_enough(counts, played, precision, score_precision, z):
+                    break
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+    metrics = _game_metrics(counts, played)
+    if sequential:
+        metrics.update(_game_intervals(counts, played, z))
+    return metrics
+
+
+def _play_on_pool(pool, seeds, n_workers: int, collector, bar):
+    # Shards are small enough to balance load; the merge is a plain sum of integer counts
+    shard = max(1, min(500, -(-len(seeds) // (n_workers * 8))))
+    ranges = [seeds[s:s + shard] for s in range(0, len(seeds), shard)]
+    counts = [0] * 6
+    for part, stats in pool.imap_unordered(_play_range_worker, ranges):
+        counts = [c + p for c, p in zip(counts, part)]
+        if stats is not None:
+            collector.merge(stats)
+        bar.update(part[-1])
+    return counts
+
+
+def _play_range(player0, player1, seeds, env_kwargs: dict, progress=None, collector=None):
     wins0 = 0
     draws = 0
-    total_score = 0.0
+    total_score = 0
+    total_score_sq = 0
     illegal0 = 0
     illegal1 = 0
 
-    for i in tqdm(
-            range(n_games),
-            desc=f"Eval {player0.__class__.__name__} vs {player1.__class__.__name__}",
-            ncols=100
-    ):
-        st = game.init_game(seed=seed0 + i, **env_kwargs)
-        res, final_state, _, _ = game.run_game(st, player0, player1)
+    for seed in seeds:
+        player0.new_game(seed)
+        player1.new_game(seed)
+        st = game.init_game(seed=seed, reveal_seed=game.reveal_seed_for(seed), **env_kwargs)
+        res, final_state, _, _ = game.run_game(st, player0, player1, record="none", collector=collector)
 
         # res = hp0 - hp1
         total_score += res
+        total_score_sq += res * res
 
         if res > 0:
             wins0 += 1
         elif res == 0:
             draws += 1
 
-        illegal0 += final_state["illegal_move"][0]
-        illegal1 += final_state["illegal_move"][1]
+        illegal0 += final_state.illegal_move[0]
+        illegal1 += final_state.illegal_move[1]
+        if progress is not None:
+            progress.update(1)
+
+    return [wins0, draws, total_score, illegal0, illegal1, total_score_sq]
+
+
+_EVAL_WORKER = {}
+
+
+def _init_eval_worker(player0, player1, env_kwargs, play, trace=None, origin=None):
+    # trace is None when not instrumenting, else the Collector's trace flag; origin is the
+    # parent Collector's, so merged trace spans share one time axis (perf_counter is
+    # system-wide on Linux)
+    _EVAL_WORKER.update(player0=player0, player1=player1, env_kwargs=env_kwargs, play=play, trace=trace,
+                        origin=origin)
+
 
-    win_rate = wins0 / n_games
-    draw_rate = draws / n_games
-    avg_score = total_score / n_games
-    avg_illegal0 = illegal0 / n_games
-    avg_illegal1 = illegal1 / n_games
+def _play_range_worker(seeds):
+    w = _EVAL_WORKER
+    stats = Collector(trace=w["trace"], origin=w["origin"]) if w["trace"] is not None else None
+    return w["play"](w["player0"], w["player1"], seeds, w["env_kwargs"], collector=stats) + [len(seeds)], stats
 
+
+def _game_metrics(counts, n_games: int):
+    wins0, draws, total_score, illegal0, illegal1 = counts[:5]
+    return {
+        "wins_p0": wins0,
+        "draws": draws,
+        "win_rate_p0": wins0 / n_games,
+        "draw_rate": draws / n_games,
+        "avg_score(hp0-hp1)": total_score / n_games,
+        "avg_illegal_p0": illegal0 / n_games,
+        "avg_illegal_p1": illegal1 / n_games,
+    }
+
+
+def _wilson(k: int, n: int, z: float):
+    p = k / n
+    center = (p + z * z / (2 * n)) / (1 + z * z / n)
+    half = z * np.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+    return center - half, center + half
+
+
+def _game_intervals(counts, n_games: int, z: float):
+    wins0, draws, total_score, _, _, total_score_sq = counts
+    mean = total_score / n_games
+    var = max(total_score_sq / n_games - mean * mean, 0.0) * n_games / max(n_games - 1, 1)
+    half = z * np.sqrt(var / n_games)
     return {
-        "win_rate_p0": win_rate,
-        "draw_rate": draw_rate,
-        "avg_score(hp0-hp1)": avg_score,
-        "avg_illegal_p0": avg_illegal0,
-        "avg_illegal_p1": avg_illegal1,
+        "win_rate_p0_ci": tuple(float(v) for v in _wilson(wins0, n_games, z)),
+        "draw_rate_ci": tuple(float(v) for v in _wilson(draws, n_games, z)),
+        "avg_score_ci": (float(mean - half), float(mean + half)),
+        "games_used": n_games,
     }
 
 
+def _precise_enough(counts, n_games: int, precision, score_precision, z: float):
+    ci = _game_intervals(counts, n_games, z)
+    if precision is not None:
+        for key in ("win_rate_p0_ci", "draw_rate_ci"):
+            lo, hi = ci[key]
+            if (hi - lo) / 2 > precision:
+                return False
+    if score_precision is not None:
+        lo, hi = ci["avg_score_ci"]
+        if (hi - lo) / 2 > score_precision:
+            return False
+    return True
+
+
+def _batchable(player):
+    # Decisions depend only on the state: no per-game reseeding through new_game
+    return type(player).new_game is game.Player.new_game
+
+
+def _play_range_vec(player0, player1, seeds, env_kwargs: dict, progress=None, collector=None):
+    vg = VecGame.from_seeds(seeds, [game.reveal_seed_for(s) for s in seeds], **env_kwargs)
+    res = vg.run(player0, player1)
+    if progress is not None:
+        progress.update(len(seeds))
+    return [int(np.sum(res > 0)), int(np.sum(res == 0)), int(res.sum()),
+            int(vg.illegal_move[:, 0].sum()), int(vg.illegal_move[:, 1].sum()), int((res * res).sum())]
+
+
 def main():
     os.makedirs(MODEL_DIR, exist_ok=True)
 
-    print(f"Loading data from: {DATA_PATH}")
-    clf = train_from_npz(DATA_PATH, MODEL)
+    if SWEEP:
+        print(f"Sweeping {len(SWEEP_GRID)} models on: {DATA_PATH}")
+        print(sweep_table(sweep(DATA_PATH, SWEEP_GRID)))
+        return
+
+    if STREAMING:
+        print(f"Streaming data from: {DATA_DIR}")
+        clf = train_streaming(DATA_DIR, MODEL)
+    else:
+        print(f"Loading data from: {DATA_PATH}")
+        clf = train_from_npz(DATA_PATH, MODEL)
 
     model_path = os.path.join(MODEL_DIR, f"policy_{MODEL}.joblib")
     joblib.dump(clf, model_path)
     print(f"\nSaved model to: {model_path}")
 
+    compiled_path = os.path.join(MODEL_DIR, f"policy_{MODEL}")
+    export_policy(clf, compiled_path)
+    print(f"Exported NumPy policy to: {compiled_path}")
+
     model_player = ModelPlayer(clf)
 
     # Baselines for evaluation
@@ -153,35 +601,41 @@ def main():
     print("==============================")
 
     # Control: Baseline vs Baseline should be ~50% win for player0 (up to randomness)
-    metrics_mb = play_many_games(model_player, baseline, EVAL_GAMES, EVAL_SEED0 + 100000, CANONICAL_ENV)
+    metrics_mb = play_many_games(model_player, baseline, EVAL_GAMES, EVAL_SEED0 + 100000, CANONICAL_ENV,
+                                 vectorized=True, n_workers=EVAL_WORKERS, precision=EVAL_PRECISION)
     print("\n[Model vs Baseline]")
     print(metrics_mb)
 
-    metrics_mt = play_many_games(model_player, tbase_1, EVAL_GAMES, EVAL_SEED0 + 300000, CANONICAL_ENV)
+    metrics_mt = play_many_games(model_player, tbase_1, EVAL_GAMES, EVAL_SEED0 + 300000, CANONICAL_ENV,
+                                 vectorized=True, n_workers=EVAL_WORKERS, precision=EVAL_PRECISION)
     print("\n[Model vs TBaseline(0.5,0.2,0.3)]")
     print(metrics_mt)
 
-    metrics_mr = play_many_games(model_player, rand, EVAL_GAMES, EVAL_SEED0 + 400000, CANONICAL_ENV)
+    metrics_mr = play_many_games(model_player, rand, EVAL_GAMES, EVAL_SEED0 + 400000, CANONICAL_ENV,
+                                 n_workers=EVAL_WORKERS, precision=EVAL_PRECISION)
     print("\n[Model vs Random]")
     print(metrics_mr)
 
-    metrics_mt2 = play_many_games(model_player, tbase_2, EVAL_GAMES, EVAL_SEED0 + 500000, CANONICAL_ENV)
+    metrics_mt2 = play_many_games(model_player, tbase_2, EVAL_GAMES, EVAL_SEED0 + 500000, CANONICAL_ENV,
+                                 vectorized=True, n_workers=EVAL_WORKERS, precision=EVAL_PRECISION)
     print("\n[Model vs TBaseline(0.7,0.2,0.5)]")
     print(metrics_mt2)
 
-    metrics_r5 = play_many_games(model_player, r_5, EVAL_GAMES, EVAL_SEED0 + 500000, CANONICAL_ENV)
+    metrics_r5 = play_many_games(model_player, r_5, EVAL_GAMES, EVAL_SEED0 + 500000, CANONICAL_ENV,
+                                 n_workers=EVAL_WORKERS, precision=EVAL_PRECISION)
     print("\n[Model vs Rollout(n=5)]")
     print(metrics_r5)
 
-    metrics_r10 = play_many_games(model_player, r_10, EVAL_GAMES, EVAL_SEED0 + 500000, CANONICAL_ENV)
+    metrics_r10 = play_many_games(model_player, r_10, EVAL_GAMES, EVAL_SEED0 + 500000, CANONICAL_ENV,
+                                 n_workers=EVAL_WORKERS, precision=EVAL_PRECISION)
     print("\n[Model vs Rollout(n=10)]")
     print(metrics_r10)
 
-    metrics_bb = play_many_games(baseline, baseline, EVAL_GAMES, EVAL_SEED0, CANONICAL_ENV)
+    metrics_bb = play_many_games(baseline, baseline, EVAL_GAMES, EVAL_SEED0, CANONICAL_ENV, n_workers=EVAL_WORKERS, precision=EVAL_PRECISION)
     print("\n[Baseline vs Baseline]")
     print(metrics_bb)
 
-    metrics_rr = play_many_games(r_5, r_5, EVAL_GAMES, EVAL_SEED0, CANONICAL_ENV)
+    metrics_rr = play_many_games(r_5, r_5, EVAL_GAMES, EVAL_SEED0, CANONICAL_ENV, n_workers=EVAL_WORKERS, precision=EVAL_PRECISION)
     print("\n[Rollout vs Rollout]")
     print(metrics_rr)
 
@@ -0,0 +1,183 @@
+import numpy as np
+import game
+
+PER_PLAYER = ("revealed", "hp", "heal_left", "reveal_left", "random_reveal_left", "skip_bullet_left",
+              "skip_round_left", "double_left", "illegal_move")
+PER_GAME = ("live", "n_rounds", "pos", "Left_real", "Left_fake", "max_hp", "damage_per_shot",
+            "skip_round_mark", "double_mark", "turn")
+
+
+class VecGame:
+    """
+    N games held as struct-of-arrays, stepped together.
+
+    Field names follow game.GameState: per-game fields are (N,) int64 arrays and per-player
+    fields are (N, 2) int64 arrays indexed by player id. The chamber and reveal bitmasks are
+    kept as int64, so chambers are limited to 63 rounds.
+
+    Random reveals draw from each game's own `rngs[i]` exactly like game.use_reveal_random,
+    so a VecGame built from states with a `reveal_seed` replays run_game move for move.
+    """
+
+    def __init__(self, states):
+        states = list(states)
+        for name in PER_GAME:
+            setattr(self, name, np.array([getattr(s, name) for s in states], dtype=np.int64))
+        for name in PER_PLAYER:
+            setattr(self, name, np.array([getattr(s, name) for s in states], dtype=np.int64).reshape(-1, 2))
+        self.rngs = [s.rng for s in states]
+
+    @classmethod
+    def from_seeds(cls, seeds, reveal_seeds=None, **env_kwargs):
+        if reveal_seeds is None:
+            reveal_seeds = [None] * len(seeds)
+        return cls(game.init_game(seed=s, reveal_seed=r, **env_kwargs) for s, r in zip(seeds, reveal_seeds))
+
+    def __len__(self):
+        return len(self.turn)
+
+    def subset(self, idx):
+        # Copy of games `idx`, used as the read-only `states` argument of decide_batch
+        sub = VecGame.__new__(VecGame)
+        for name in PER_GAME + PER_PLAYER:
+            setattr(sub, name, getattr(self, name)[idx])
+        sub.rngs = [self.rngs[i] for i in idx]
+        return sub
+
+    def state(self, i):
+        # Materialize game i as a GameState (for players without decide_batch)
+        st = game.GameState()
+        for name in PER_GAME:
+            setattr(st, name, int(getattr(self, name)[i]))
+        for name in PER_PLAYER:
+            setattr(st, name, [int(v) for v in getattr(self, name)[i]])
+        st.rng = self.rngs[i]
+        return st
+
+    def mover(self, arr):
+        # Per-player field as seen by the player to move
+        return arr[np.arange(len(self.turn)), self.turn]
+
+    def opponent(self, arr):
+        return arr[np.arange(len(self.turn)), self.turn ^ 1]
+
+    def features(self):
+        """game.state_to_feature for every game at once, as a float32 (N, 21) matrix."""
+        pos = self.pos
+        pr_real = self.Left_real / (self.Left_real + self.Left_fake + 10 ** -10)
+        hp = self.mover(self.hp) / self.max_hp
+        hp_opponent = self.opponent(self.hp) / self.max_hp
+        mine = lambda arr: self.mover(arr) > 0
+        theirs = lambda arr: self.opponent(arr) > 0
+        cols = [
+            np.where((self.revealed[:, 0] >> pos) & 1, (self.live >> pos) & 1, pr_real),
+            hp, hp_opponent,
+            mine(self.heal_left), mine(self.reveal_left), theirs(self.heal_left), theirs(self.reveal_left),
+            1 - (np.abs(pr_real - 0.5) * 2),
+            pos / self.n_rounds,
+            (self.mover(self.revealed) >> pos) & 1,
+            hp - hp_opponent,
+            mine(self.double_left), mine(self.skip_round_left), theirs(self.skip_round_left),
+            mine(self.skip_bullet_left), theirs(self.skip_bullet_left), theirs(self.double_left),
+            self.double_mark, self.skip_round_mark,
+            mine(self.random_reveal_left), theirs(self.random_reveal_left),
+        ]
+        X = np.empty((len(pos), len(cols)), dtype=np.float32)
+        for k, col in enumerate(cols):
+            X[:, k] = col
+        return X
+
+    def unfinished(self):
+        return (self.hp[:, 0] > 0) & (self.hp[:, 1] > 0) & (self.pos < self.n_rounds)
+
+    def result(self):
+        return self.hp[:, 0] - self.hp[:, 1]
+
+    def step(self, idx, actions):
+        """Apply actions[k] to game idx[k] for the player to move in each game."""
+        idx = np.asarray(idx, dtype=np.int64)
+        actions = np.asarray(actions, dtype=np.int64)
+
+        for goal in (0, 1):
+            self._shot(idx[actions == goal], goal)
+
+        for action, counts in ((2, self.heal_left), (3, self.reveal_left), (4, self.double_left),
+                               (5, self.skip_round_left), (6, self.skip_bullet_left),
+                               (7, self.random_reveal_left)):
+            i = idx[actions == action]
+            if i.size == 0:
+                continue
+            t = self.turn[i]
+            ok = counts[i, t] > 0
+            self._illegal(i[~ok])
+            i, t = i[ok], t[ok]
+            counts[i, t] -= 1
+            if action == 2:
+                self.hp[i, t] = np.minimum(self.hp[i, t] + self.damage_per_shot[i], self.max_hp[i])
+            elif action == 3:
+                self.revealed[i, t] |= 1 << self.pos[i]
+            elif action == 4:
+                self.double_mark[i] = 1
+            elif action == 5:
+                self.skip_round_mark[i] = 1
+            elif action == 6:
+                self.pos[i] += 1
+            else:
+                self._reveal_random(i, t)
+
+        self._illegal(idx[(actions < 0) | (actions > 7)])
+
+    def _shot(self, i, goal):
+        if i.size == 0:
+            return
+        if np.any(self.pos[i] >= self.n_rounds[i]):
+            raise Exception("Trying to shoot a bullet out of range... There must be a bug!")
+        live = ((self.live[i] >> self.pos[i]) & 1).astype(bool)
+
+        j = i[live]
+        self.hp[j, self.turn[j] ^ goal] -= self.damage_per_shot[j] * (self.double_mark[j] + 1)
+        self.turn[j] ^= 1 ^ self.skip_round_mark[j]
+        self.skip_round_mark[j] = 0
+        self.Left_real[j] -= 1
+
+        j = i[~live]
+        if goal == 1:
+            self.turn[j] ^= 1 ^ self.skip_round_mark[j]
+            self.skip_round_mark[j] = 0
+        self.Left_fake[j] -= 1
+
+        self.pos[i] += 1
+        self.double_mark[i] = 0
+
+    def _reveal_random(self, i, t):
+        target = self.pos[i].copy()
+        for k in np.flatnonzero(self.pos[i] < self.n_rounds[i] - 1):
+            g = i[k]
+            target[k] = self.rngs[g].randint(self.pos[g] + 1, self.n_rounds[g] - 1)
+        self.revealed[i, t] |= 1 << target
+
+    def _illegal(self, i):
+        if i.size == 0:
+            return
+        t = self.turn[i]
+        self.hp[i, t] -= self.damage_per_shot[i]
+        self.illegal_move[i, t] += 1
+        self.turn[i] ^= 1
+
+    def decide(self, player, idx):
+        if hasattr(player, "decide_batch"):
+            return player.decide_batch(self.subset(idx))
+        return np.array([player.decide(self.state(i)) for i in idx], dtype=np.int64)
+
+    def run(self, player0, player1):
+        """Play every game to the end; returns hp0 - hp1 per game like game.run_game."""
+        players = (player0, player1)
+        active = np.flatnonzero(self.unfinished())
+        while active.size:
+            turn = self.turn[active]
+            for p in (0, 1):
+                idx = active[turn == p]
+                if idx.size:
+                    self.step(idx, self.decide(players[p], idx))
+            active = active[self.unfinished()[active]]
+        return self.result()